@@ -1,19 +1,176 @@
 import gridworld
 from ai import *
 from math import *
-from queue import PriorityQueue
+from array import array
+from time import perf_counter
+import fringe
+import costmodel
+import highways
+import jps
 
 #-------------A* pathfinding algorithms--------------
 # NOTE: All A* are based off of sequential-heuristic.
-#       We use h = inf as a dummy heuristic to make
-#       the supplemental heuristics useless
+#       With a single heuristic only the anchor queue
+#       is searched, which is plain (weighted) A*
+
+# GridView gives [y][x] access to a flat per-cell sequence, the way
+# QGridScene.displayPathfinding reads the f, g and h values of a result
+class GridView:
+    def __init__(self, values, rows, cols):
+        self.values = values
+        self.rows = rows
+        self.cols = cols
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, y):
+        if not 0 <= y < self.rows:
+            raise IndexError("grid row out of range")
+
+        return GridRow(self.values, y * self.cols, self.cols)
+
+class GridRow:
+    __slots__ = ('values', 'offset', 'cols')
+
+    def __init__(self, values, offset, cols):
+        self.values = values
+        self.offset = offset
+        self.cols = cols
+
+    def __len__(self):
+        return self.cols
+
+    def __getitem__(self, x):
+        if not 0 <= x < self.cols:
+            raise IndexError("grid column out of range")
+
+        return self.values[self.offset + x]
+
+# SearchBuffers holds the state of one search queue in flat arrays
+# indexed by y * cols + x, so it can be reused for every query on a map.
+# - g, f: Path cost and priority of each cell
+# - parent: Index of the cell each cell was reached from, -1 for none
+# - stamp: Generation in which g, f and parent were last written; values
+#   from older generations are stale and read as inf / -1
+# - closed: Generation in which the cell was last closed
+# - fringe: Open list, a fringe.OpenSet ('heap') or BucketOpenSet ('bucket')
+# reset() starts a new generation instead of clearing the arrays.
+class SearchBuffers:
+    def __init__(self, size, open_list = 'heap'):
+        if open_list not in fringe.OPEN_LISTS:
+            raise ValueError(f"Unknown open list '{open_list}', expected one of {', '.join(fringe.OPEN_LISTS)}")
+
+        self.size = size
+        self.g = array('d', [inf]) * size
+        self.f = array('d', [inf]) * size
+        self.parent = array('i', [-1]) * size
+        self.stamp = array('I', [0]) * size
+        self.closed = array('I', [0]) * size
+        self.fringe = fringe.OPEN_LISTS[open_list](size)
+        self.generation = 0
+
+    def reset(self):
+        self.generation += 1
+        self.fringe.clear()
+
+        if self.generation > 0xFFFFFFFF:  # Stamps wrapped around, clear them for real
+            self.stamp = array('I', [0]) * self.size
+            self.closed = array('I', [0]) * self.size
+            self.generation = 1
+
+    def gAt(self, i):
+        return self.g[i] if self.stamp[i] == self.generation else inf
+
+    def fAt(self, i):
+        return self.f[i] if self.stamp[i] == self.generation else inf
+
+    def parentAt(self, i):
+        return self.parent[i] if self.stamp[i] == self.generation else -1
+
+    # Read-only [i] access to g or f for the current generation.
+    # The view goes stale (all inf) once the buffers are reset.
+    def view(self, name):
+        return StampedValues(getattr(self, name), self.stamp, self.generation, self)
+
+    # Path of (x, y) tuples from the start to cell i
+    def path(self, i, cols):
+        ret = []
+        while i != -1:
+            ret.append((i % cols, i // cols))
+            i = self.parentAt(i)
+
+        ret.reverse()
+        return ret
+
+class StampedValues:
+    __slots__ = ('values', 'stamp', 'generation', 'buffers')
+
+    def __init__(self, values, stamp, generation, buffers):
+        self.values = values
+        self.stamp = stamp
+        self.generation = generation
+        self.buffers = buffers
+
+    def __getitem__(self, i):
+        if self.buffers.generation == self.generation and self.stamp[i] == self.generation:
+            return self.values[i]
+
+        return inf
+
+# SearchStats collects counters for one search
+# - expansions: Cells expanded, per queue (0 is the anchor)
+# - relaxations: Edges that improved the g-value of a cell
+# - reopenings: Closed cells that were opened again
+# - max_open: Largest size reached by any open list
+# - pushes, pops: Heap operations, including stale entries
+# - h_time: Seconds spent building heuristic fields before the search
+# - search_time: Seconds spent in the main loop
+class SearchStats:
+    def __init__(self, n_h):
+        self.expansions = [0] * n_h
+        self.relaxations = 0
+        self.reopenings = 0
+        self.max_open = 0
+        self.pushes = 0
+        self.pops = 0
+        self.h_time = 0.0
+        self.search_time = 0.0
+
+    # SearchStats from the dict of asDict
+    @classmethod
+    def fromDict(cls, d):
+        ret = cls(len(d['expansions']))
+        for name, value in d.items():
+            setattr(ret, name, list(value) if name == 'expansions' else value)
+
+        return ret
+
+    def totalExpansions(self):
+        return sum(self.expansions)
+
+    def asDict(self):
+        return {
+            'expansions': list(self.expansions),
+            'relaxations': self.relaxations,
+            'reopenings': self.reopenings,
+            'max_open': self.max_open,
+            'pushes': self.pushes,
+            'pops': self.pops,
+            'h_time': self.h_time,
+            'search_time': self.search_time
+        }
+
+    def __repr__(self):
+        return f"SearchStats({self.asDict()})"
 
 # Default A*
 # map: Gridworld terrain map
 # start: Tuple representing start coordinates in (x, y)
 # goal: Tuple representing goal coordinates in (x, y)
-def default(map, start, goal):
-    return weighted(map, start, goal, 1)
+# Other keyword arguments are passed on to sequential
+def default(map, start, goal, **kwargs):
+    return weighted(map, start, goal, 1, **kwargs)
 
 # Weighted
 # map: Gridworld terrain map
@@ -21,15 +178,17 @@ def default(map, start, goal):
 # goal: Tuple representing goal coordinates in (x, y)
 # h: Heuristic function, default h_pythagorean
 # w: Weight, default 1.0
-def weighted(map, start, goal, w=1, h = h_pythagorean):
-    return sequential(map, start, goal, w, 1, [h, lambda **kwa: inf])
+# Other keyword arguments are passed on to sequential
+def weighted(map, start, goal, w=1, h = h_pythagorean, **kwargs):
+    return sequential(map, start, goal, w, 1, [h], **kwargs)
 
 # Uniform-cost
 # map: Gridworld terrain map
 # start: Tuple representing start coordinates in (x, y)
 # goal: Tuple representing goal coordinates in (x, y)
-def uniform(map, start, goal):
-    return weighted(map, start, goal, 0, h_uniform_first) 
+# Other keyword arguments are passed on to sequential
+def uniform(map, start, goal, **kwargs):
+    return weighted(map, start, goal, 0, h_uniform_first, **kwargs)
 
 # Sequential-Heuristic
 # map: Gridworld terrain map
@@ -38,72 +197,603 @@ def uniform(map, start, goal):
 # w: Overall weight, default 1.25
 # w2: Inadmissable-favored weight, default 2
 # list_h: List of heuristic functions to iterate over, list_h[0] is the anchor heuristic
-def sequential(map, start, goal, w = 1.25, w2 = 2, list_h = all_heuristics):
-    rows = len(map)
-    cols = len(map[0])
+# Other keyword arguments are as for iterSequential
+# Returns a dict with the path ('map'), its 'cost', the number of
+# 'expansions', the SearchStats ('stats') and [y][x] grids of 'f', 'g'
+# and 'h', or None on failure
+def sequential(map, start, goal, w = 1.25, w2 = 2, list_h = all_heuristics, **kwargs):
+    return run(iterSequential(map, start, goal, w, w2, list_h, batch = None, **kwargs))
+
+# Drive a search generator to the end and return its result
+def run(search):
+    try:
+        while True:
+            next(search)
+    except StopIteration as e:
+        return e.value
+
+# Streaming Sequential-Heuristic
+# NOTE: This is the search behind all the A* above. It is a generator that
+#       yields progress every batch expansions and returns the result dict
+#       of sequential (see run). Closing the generator cancels the search.
+#       Use (w, 1, [h]) for weighted A* and (0, 1, [h_uniform_first]) for
+#       uniform-cost search.
+# map, start, goal, w, w2, list_h: As for sequential
+# profile: Edge cost profile, default costmodel.STANDARD
+# h_mode: How heuristic fields are computed, see ai.heuristicField
+# buffers: List of at least len(list_h) SearchBuffers to reuse, default new ones
+# fields: List of ai.HeuristicField to use for list_h, default new ones
+# on_expand: Called as on_expand(s, k) when cell s is expanded from queue k
+# on_relax: Called as on_relax(s, s_p, g) when s_p is reached from s with cost g
+# expand: 'full' relaxes all 8 neighbours of a cell, 'jump' prunes symmetric
+#         neighbours and jumps across plain terrain (see jps.py); the path
+#         is the same cost, but only jump points are expanded and relaxed;
+#         'highway' replaces the steps along highways with the edges of
+#         highways.py, so highways are ridden in a few expansions; the
+#         path is the same cost with an admissible heuristic
+# open_list: Open list of new buffers, 'heap' or 'bucket' (see fringe.py);
+#            both expand the same cells in the same order
+# batch: Expansions per yield, None to never yield
+# Yields (expanded, opened): lists of (x, y) cells expanded and added to
+# an open list since the previous yield
+def iterSequential(map, start, goal, w = 1.25, w2 = 2, list_h = all_heuristics, profile = None, h_mode = 'auto', buffers = None, fields = None, on_expand = None, on_relax = None, expand = 'full', open_list = 'heap', batch = 256):
+    rows = map.rows
+    cols = map.cols
+    edges = costmodel.edgeCosts(map, profile)
+    neighbours = tuple(zip(edges.offsets, edges.costs))
+    jumps = None
+    overlay = None
+    shortcuts = None
+
+    if expand == 'jump':
+        jumps = jps.jumpTable(map, profile)
+    elif expand == 'highway':
+        overlay = highways.highwayOverlay(map, profile)
+        shortcuts = overlay.refresh()
+    elif expand != 'full':
+        raise ValueError(f"Unknown expansion '{expand}', expected 'full', 'jump' or 'highway'")
     n_h = len(list_h)
-    expansions = 0
-    fringes = [PriorityQueue() for i in range(5)]
-    closed = []
-    
-    parent_set = {k: {i: {j: None for j in range(cols)} for i in range(rows)} for k in range(n_h)}
-    f_set = {k: {i: {j: inf for j in range(cols)} for i in range(rows)} for k in range(n_h)}
-    g_set = {k: {i: {j: inf for j in range(cols)} for i in range(rows)} for k in range(n_h)}
-    h_set = {k: {i: {j: list_h[k](start = start, goal = goal, v = (j, i)) for j in range(cols)} for i in range(rows)} for k in range(n_h)}
+    stats = SearchStats(n_h)
+    expanded = stats.expansions
+    relaxations = 0
+    reopenings = 0
+    max_open = 0
+
+    t = perf_counter()
+    h_set = fields or [heuristicField(h, map, start, goal, h_mode) for h in list_h]
+    start_i = start[1] * cols + start[0]
+    goal_i = goal[1] * cols + goal[0]
+    stats.h_time = perf_counter() - t
+
+    if buffers is None:
+        buffers = [SearchBuffers(rows * cols, open_list) for i in range(n_h)]
 
     for i in range(n_h):
-        f_set[i][start[1]][start[0]] = 0 + w * h_set[i][start[1]][start[0]]
-        g_set[i][start[1]][start[0]] = 0
-        fringes[i].put((f_set[i][start[1]][start[0]], start))
-
-    while fringes[0].queue[0][0] < inf:
-        for k in range(1, n_h):
-            minkey = fringes[0].queue[0][0]
-            minkey2 = fringes[k].queue[0][0]
-
-            # 0th key or ith key has the current smallest fscore 
-            min_i = k if minkey2 <= w2 * minkey else 0
-
-            fringe = fringes[min_i]
-            parent = parent_set[min_i]
-            f = f_set[min_i]
-            g = g_set[min_i]
-            h = h_set[min_i]
-
-            pop = fringe.get() 
-            s = pop[1]
-
-            if g[goal[1]][goal[0]] <= pop[0] and g[goal[1]][goal[0]] < inf:  # End goal 
-                s = goal 
-                ret = {'f': f, 'g': g, "h": h, 'map': [s]}
-                print("Expansions: ", expansions)
-
-                while parent[s[1]][s[0]] != None:
-                    s = parent[s[1]][s[0]]
-                    ret['map'].insert(0, s)
-                    
-                return ret
-
-            for i in range(max(0, s[1] - 1), min(rows, s[1] + 2)):
-                for j in range(max(0, s[0] - 1), min(cols, s[0] + 2)):
-                    s_p = (j, i)
-
-                    if s_p == s:
-                        continue
-
-                    g_temp = g[s[1]][s[0]] + cost(map, s, s_p)
-
-                    if s_p not in closed and g_temp < g[i][j]:
-                        parent[i][j] = s
-                        g[i][j] = g_temp
-                        f[i][j] = g[i][j] + w * h[i][j]
-                        expansions += 1
-                        in_fringe = False
-                        with fringe.mutex:
-                            in_fringe = s_p in fringe.queue
-
-                        if not in_fringe:
-                            fringe.put((f[i][j], s_p))
-
-    print("failed")
-    return None
+        b = buffers[i]
+        b.reset()
+        b.stamp[start_i] = b.generation
+        b.g[start_i] = 0
+        b.f[start_i] = 0 + w * h_set[i].compute(start_i)
+        b.parent[start_i] = -1
+        b.fringe.push(start_i, b.f[start_i])
+
+    ret = None
+    done = []
+    opened = []
+    t = perf_counter()
+    k = 0
+    while buffers[0].fringe.minKey() < inf:
+        # Round-robin over the inadmissible queues; with a single
+        # heuristic, only the anchor queue is ever searched
+        k = k % (n_h - 1) + 1 if n_h > 1 else 0
+        minkey = buffers[0].fringe.minKey()
+        minkey2 = buffers[k].fringe.minKey()
+
+        # 0th key or kth key has the current smallest fscore 
+        min_i = k if minkey2 <= w2 * minkey else 0
+
+        b = buffers[min_i]
+        fringe = b.fringe
+        gen = b.generation
+        stamp = b.stamp
+        closed = b.closed
+        parent = b.parent
+        f = b.f
+        g = b.g
+        h = h_set[min_i]
+        h_values = h.values
+
+        key, n = fringe.pop()
+
+        if b.gAt(goal_i) <= key and b.gAt(goal_i) < inf:  # End goal 
+            path = b.path(goal_i, cols)
+            if jumps is not None:
+                path = jps.fillPath(path)
+            elif overlay is not None:
+                path = overlay.fillPath(path)
+
+            ret = {
+                'f': GridView(b.view('f'), rows, cols),
+                'g': GridView(b.view('g'), rows, cols),
+                'h': GridView(h, rows, cols),
+                'map': path,
+                'cost': b.gAt(goal_i),
+                'stats': stats
+            }
+            break
+
+        closed[n] = gen
+        g_n = g[n]
+        expanded[min_i] += 1
+
+        if on_expand is not None:
+            on_expand((n % cols, n // cols), min_i)
+
+        if batch is not None:
+            done.append((n % cols, n // cols))
+
+        # Jump and highway successors come as (offset, cost) rather than
+        # (offset, table). Away from uniform cells, every jump is one step,
+        # so those cells are relaxed like full expansion.
+        if jumps is not None and jumps.near[n]:
+            successors = jumps.successors(n, parent[n], goal_i)
+        elif shortcuts is not None and n in shortcuts:
+            successors = overlay.successors(n, goal_i)
+        else:
+            successors = neighbours
+
+        lookup = successors is neighbours
+        for o, c in successors:
+            if lookup:
+                c = c[n]
+
+            if c == inf:
+                continue
+
+            m = n + o
+            g_temp = g_n + c
+
+            if stamp[m] != gen:
+                stamp[m] = gen
+            elif g_temp >= g[m]:
+                continue
+
+            parent[m] = n
+            g[m] = g_temp
+            h_p = h_values[m]
+            if h_p != h_p:
+                h_p = h.compute(m)
+
+            f[m] = g_temp + w * h_p
+            relaxations += 1
+
+            if on_relax is not None:
+                on_relax((n % cols, n // cols), (m % cols, m // cols), g_temp)
+
+            # A closed cell is only improved upon through an
+            # inconsistent (or weighted) heuristic, so it is
+            # explicitly re-opened rather than ignored
+            if closed[m] == gen:
+                closed[m] = 0
+                reopenings += 1
+
+            fringe.push(m, f[m])
+
+            if batch is not None:
+                opened.append((m % cols, m // cols))
+
+        if len(fringe) > max_open:
+            max_open = len(fringe)
+
+        if batch is not None and len(done) >= batch:
+            stats.search_time += perf_counter() - t
+            yield done, opened
+            done = []
+            opened = []
+            t = perf_counter()
+
+    stats.search_time += perf_counter() - t
+
+    if done:
+        yield done, opened
+
+    stats.relaxations = relaxations
+    stats.reopenings = reopenings
+    stats.max_open = max_open
+    stats.pushes = sum(b.fringe.pushes for b in buffers[:n_h])
+    stats.pops = sum(b.fringe.pops for b in buffers[:n_h])
+
+    if ret:
+        ret['expansions'] = stats.totalExpansions()
+
+    return ret
+
+# Bidirectional
+# map: Gridworld terrain map
+# start: Tuple representing start coordinates in (x, y)
+# goal: Tuple representing goal coordinates in (x, y)
+# w: Weight, default 0 (bidirectional uniform-cost)
+# h: Heuristic function, default h_uniform_first
+# Other keyword arguments are as for iterBidirectional
+# Returns a dict as for sequential; 'stats' counts the expansions of the
+# forward and backward searches separately
+def bidirectional(map, start, goal, w = 0, h = h_uniform_first, **kwargs):
+    return run(iterBidirectional(map, start, goal, w, h, batch = None, **kwargs))
+
+# Streaming Bidirectional
+# NOTE: Searches forward from start and backward from goal at once,
+#       always expanding the side with the smaller key. Edge costs are
+#       symmetric, so the backward search uses the same edge table.
+#       With w = 0 it stops once the two smallest g-values add up to the
+#       best start-goal path seen, which is exact. With w > 0 it stops
+#       once either side's smallest f-value reaches that path, which is
+#       exact for w = 1 and an admissible h.
+# map, start, goal, w, h: As for bidirectional
+# profile, h_mode, on_expand, on_relax, open_list, batch: As for
+#       iterSequential; on_expand is called with queue 0 for forward and 1
+#       for backward
+# buffers: List of at least 2 SearchBuffers to reuse, default new ones
+# fields: Heuristic fields towards goal and towards start, default new ones
+def iterBidirectional(map, start, goal, w = 0, h = h_uniform_first, profile = None, h_mode = 'auto', buffers = None, fields = None, on_expand = None, on_relax = None, open_list = 'heap', batch = 256):
+    rows = map.rows
+    cols = map.cols
+    edges = costmodel.edgeCosts(map, profile)
+    neighbours = tuple(zip(edges.offsets, edges.costs))
+    stats = SearchStats(2)
+    expanded = stats.expansions
+    relaxations = 0
+    reopenings = 0
+    max_open = 0
+
+    t = perf_counter()
+    h_set = fields or [heuristicField(h, map, start, goal, h_mode), heuristicField(h, map, goal, start, h_mode)]
+    start_i = start[1] * cols + start[0]
+    goal_i = goal[1] * cols + goal[0]
+    stats.h_time = perf_counter() - t
+
+    if buffers is None:
+        buffers = [SearchBuffers(rows * cols, open_list) for i in range(2)]
+
+    for side, root in enumerate((start_i, goal_i)):
+        b = buffers[side]
+        b.reset()
+        b.stamp[root] = b.generation
+        b.g[root] = 0
+        b.f[root] = 0 + w * h_set[side].compute(root)
+        b.parent[root] = -1
+        b.fringe.push(root, b.f[root])
+
+    # Cheapest start-goal path through a cell reached from both sides
+    mu = inf
+    meet = -1
+    if start_i == goal_i:
+        mu = 0
+        meet = start_i
+
+    done = []
+    opened = []
+    t = perf_counter()
+    while True:
+        k_0 = buffers[0].fringe.minKey()
+        k_1 = buffers[1].fringe.minKey()
+
+        if (k_0 + k_1 if w == 0 else max(k_0, k_1)) >= mu:
+            break
+
+        side = 0 if k_0 <= k_1 else 1
+        b = buffers[side]
+        other = buffers[1 - side]
+        other_g = other.g
+        other_stamp = other.stamp
+        other_gen = other.generation
+        fringe = b.fringe
+        gen = b.generation
+        stamp = b.stamp
+        closed = b.closed
+        parent = b.parent
+        f = b.f
+        g = b.g
+        h = h_set[side]
+        h_values = h.values
+
+        key, n = fringe.pop()
+        closed[n] = gen
+        g_n = g[n]
+        expanded[side] += 1
+
+        if on_expand is not None:
+            on_expand((n % cols, n // cols), side)
+
+        if batch is not None:
+            done.append((n % cols, n // cols))
+
+        for o, c in neighbours:
+            c = c[n]
+
+            if c == inf:
+                continue
+
+            m = n + o
+            g_temp = g_n + c
+
+            if stamp[m] != gen:
+                stamp[m] = gen
+            elif g_temp >= g[m]:
+                continue
+
+            parent[m] = n
+            g[m] = g_temp
+            h_p = h_values[m]
+            if h_p != h_p:
+                h_p = h.compute(m)
+
+            f[m] = g_temp + w * h_p
+            relaxations += 1
+
+            if on_relax is not None:
+                on_relax((n % cols, n // cols), (m % cols, m // cols), g_temp)
+
+            if other_stamp[m] == other_gen and g_temp + other_g[m] < mu:
+                mu = g_temp + other_g[m]
+                meet = m
+
+            if closed[m] == gen:
+                closed[m] = 0
+                reopenings += 1
+
+            fringe.push(m, f[m])
+
+            if batch is not None:
+                opened.append((m % cols, m // cols))
+
+        if len(fringe) > max_open:
+            max_open = len(fringe)
+
+        if batch is not None and len(done) >= batch:
+            stats.search_time += perf_counter() - t
+            yield done, opened
+            done = []
+            opened = []
+            t = perf_counter()
+
+    stats.search_time += perf_counter() - t
+
+    if done:
+        yield done, opened
+
+    stats.relaxations = relaxations
+    stats.reopenings = reopenings
+    stats.max_open = max_open
+    stats.pushes = sum(b.fringe.pushes for b in buffers[:2])
+    stats.pops = sum(b.fringe.pops for b in buffers[:2])
+
+    if meet == -1:
+        return None
+
+    b = buffers[0]
+    backward = buffers[1].path(meet, cols)
+    backward.reverse()
+
+    return {
+        'f': GridView(b.view('f'), rows, cols),
+        'g': GridView(b.view('g'), rows, cols),
+        'h': GridView(h_set[0], rows, cols),
+        'map': b.path(meet, cols) + backward[1:],
+        'cost': mu,
+        'stats': stats,
+        'expansions': stats.totalExpansions()
+    }
+
+# Anytime (ARA*)
+# map: Gridworld terrain map
+# start: Tuple representing start coordinates in (x, y)
+# goal: Tuple representing goal coordinates in (x, y)
+# w: Initial weight, default 3
+# h: Heuristic function, default h_pythagorean
+# Other keyword arguments are as for iterAnytime
+# Returns the best result found, see iterAnytime
+def anytime(map, start, goal, w = 3, h = h_pythagorean, **kwargs):
+    return run(iterAnytime(map, start, goal, w, h, batch = None, **kwargs))
+
+# Streaming Anytime
+# NOTE: Anytime Repairing A*: a first path is found quickly with a large
+#       weight, then the weight is lowered step by step. Each round
+#       reuses the g-values and open list of the last one; cells whose g
+#       improved after they were closed are kept aside (INCONS) and
+#       reopened for the next round instead of searched again.
+#       After each round, cost / min(g + h) over the open cells bounds
+#       how far the path can be from optimal. The bound is only proven
+#       when h is admissible (its admissible attribute is true, e.g.
+#       landmarks.h_landmarks); h_pythagorean is not on highways, so no
+#       bound is given for it.
+# map, start, goal, h, profile, h_mode, on_expand, on_relax, open_list,
+#       batch: As for iterSequential
+# w: Initial weight
+# step: Weight decrement per round
+# deadline: Seconds the search may run for, None for no limit; the best
+#           path found by then is returned
+# on_solution: Called with the result dict of every improved solution
+# buffers: List of at least 1 SearchBuffers to reuse, default a new one
+# fields: List of 1 heuristic field for h, default a new one
+# Returns a dict as for sequential, plus the 'bound' (None unless h is
+# admissible) and weight 'w' of the path, and 'solutions': (cost, bound,
+# w, seconds) of each improvement; None if no path was found in time
+def iterAnytime(map, start, goal, w = 3, h = h_pythagorean, step = 0.5, deadline = None, on_solution = None, profile = None, h_mode = 'auto', buffers = None, fields = None, on_expand = None, on_relax = None, open_list = 'heap', batch = 256):
+    rows = map.rows
+    cols = map.cols
+    size = rows * cols
+    edges = costmodel.edgeCosts(map, profile)
+    neighbours = tuple(zip(edges.offsets, edges.costs))
+    stats = SearchStats(1)
+    expanded = stats.expansions
+    relaxations = 0
+    reopenings = 0
+    max_open = 0
+    begin = perf_counter()
+    stop = inf if deadline is None else begin + deadline
+
+    t = perf_counter()
+    admissible = getattr(h, 'admissible', False)
+    h = (fields or [heuristicField(h, map, start, goal, h_mode)])[0]
+    h_values = h.values
+    start_i = start[1] * cols + start[0]
+    goal_i = goal[1] * cols + goal[0]
+    stats.h_time = perf_counter() - t
+
+    b = (buffers or [SearchBuffers(size, open_list)])[0]
+    b.reset()
+    fringe = b.fringe
+    gen = b.generation
+    stamp = b.stamp
+    parent = b.parent
+    f = b.f
+    g = b.g
+
+    stamp[start_i] = gen
+    g[start_i] = 0
+    parent[start_i] = -1
+    f[start_i] = w * h.compute(start_i)
+    fringe.push(start_i, f[start_i])
+
+    ret = None
+    solutions = []
+    incons = set()
+    pushes = 0
+    pops = 0
+    done = []
+    opened = []
+    timed_out = False
+    h_goal = h.compute(goal_i)
+    t = perf_counter()
+
+    while True:
+        # Closed only for this round
+        closed = bytearray(size)
+
+        while fringe.minKey() < (g[goal_i] + w * h_goal if stamp[goal_i] == gen else inf):
+            if expanded[0] & 63 == 0 and perf_counter() > stop:
+                timed_out = True
+                break
+
+            key, n = fringe.pop()
+            closed[n] = 1
+            g_n = g[n]
+            expanded[0] += 1
+
+            if on_expand is not None:
+                on_expand((n % cols, n // cols), 0)
+
+            if batch is not None:
+                done.append((n % cols, n // cols))
+
+            for o, c in neighbours:
+                c = c[n]
+
+                if c == inf:
+                    continue
+
+                m = n + o
+                g_temp = g_n + c
+
+                if stamp[m] != gen:
+                    stamp[m] = gen
+                elif g_temp >= g[m]:
+                    continue
+
+                parent[m] = n
+                g[m] = g_temp
+                h_p = h_values[m]
+                if h_p != h_p:
+                    h_p = h.compute(m)
+
+                f[m] = g_temp + w * h_p
+                relaxations += 1
+
+                if on_relax is not None:
+                    on_relax((n % cols, n // cols), (m % cols, m // cols), g_temp)
+
+                if closed[m]:
+                    incons.add(m)
+                    reopenings += 1
+                else:
+                    fringe.push(m, f[m])
+
+                    if batch is not None:
+                        opened.append((m % cols, m // cols))
+
+            if len(fringe) > max_open:
+                max_open = len(fringe)
+
+            if batch is not None and len(done) >= batch:
+                stats.search_time += perf_counter() - t
+                yield done, opened
+                done = []
+                opened = []
+                t = perf_counter()
+
+        if timed_out or stamp[goal_i] != gen:
+            break
+
+        # Suboptimality bound of the path: with an admissible h, no path
+        # can cost less than the smallest g + h of a cell still to be
+        # (re)expanded
+        cost = g[goal_i]
+        bound = None
+
+        if admissible:
+            lower = min((g[i] + h[i] for i in incons), default = inf)
+            for i in fringe.cells():
+                lower = min(lower, g[i] + h[i])
+
+            bound = min(w, cost / lower) if lower > 0 else w
+            bound = max(bound, 1)
+
+        if ret is None or cost < ret['cost'] or (bound is not None and bound < ret['bound']):
+            ret = {
+                'f': GridView(b.view('f'), rows, cols),
+                'g': GridView(b.view('g'), rows, cols),
+                'h': GridView(h, rows, cols),
+                'map': b.path(goal_i, cols),
+                'cost': cost,
+                'bound': bound,
+                'w': w,
+                'stats': stats,
+                'expansions': stats.totalExpansions(),
+                'solutions': solutions
+            }
+            solutions.append((cost, bound, w, perf_counter() - begin))
+
+            if on_solution is not None:
+                on_solution(ret)
+
+        if w <= 1 or (bound is not None and bound <= 1):
+            break
+
+        # Next round: lower the weight, reopen the inconsistent cells and
+        # re-key the open list
+        w = max(1, w - step)
+        cells = fringe.cells() | incons
+        incons = set()
+        pushes += fringe.pushes
+        pops += fringe.pops
+        fringe.clear()
+
+        for i in cells:
+            f[i] = g[i] + w * h[i]
+            fringe.push(i, f[i])
+
+    stats.search_time += perf_counter() - t
+
+    if done:
+        yield done, opened
+
+    stats.relaxations = relaxations
+    stats.reopenings = reopenings
+    stats.max_open = max_open
+    stats.pushes = pushes + fringe.pushes
+    stats.pops = pops + fringe.pops
+
+    if ret:
+        ret['expansions'] = stats.totalExpansions()
+
+    return ret
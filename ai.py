@@ -1,5 +1,7 @@
 import gridworld
+import costmodel
 from math import *
+from array import array
 
 #------------Heuristic Algorithms-------------
 # NOTE: Using kwargs to define abstract heuristics function
@@ -51,6 +53,9 @@ def h_delta(**kwargs):
 def h_uniform_first(**kwargs):
     return 0
 
+# Never overestimates, so a_star.iterAnytime can prove bounds with it
+h_uniform_first.admissible = True
+
 # Internally, maintain a list of all the usable heuristics functions
 all_heuristics = [
     h_pythagorean,
@@ -60,32 +65,122 @@ all_heuristics = [
     h_delta
 ]
 
-def isAdmissible (hCur, hParent, cost):
-    return hParent <= cost + hCur
+#------------Heuristic Fields-------------
+# NOTE: A field holds the heuristic value of every cell of the map in a
+#       flat array indexed by y * cols + x. Batch forms compute the whole
+#       field a row at a time, which avoids one **kwargs call per cell.
+#       Use the following signature for batch forms:
+#       (rows, cols, start, goal) -> array('d') of rows * cols values
 
-def cost(map, s, s_prime):
-    v = map[s[1]][s[0]]
-    v_prime = map[s_prime[1]][s_prime[0]]
-    ret = inf
+def _field(rows, cols, fn):
+    ret = array('d')
+    for y in range(rows):
+        ret.extend(fn(y))
+
+    return ret
+
+def hf_pythagorean(rows, cols, start, goal):
+    dx2 = [(goal[0] - x) ** 2 for x in range(cols)]
+    return _field(rows, cols, lambda y: [(a + (goal[1] - y) ** 2) ** 0.5 for a in dx2])
+
+def hf_manhattan(rows, cols, start, goal):
+    dx = [abs(goal[0] - x) for x in range(cols)]
+    return _field(rows, cols, lambda y: [a + abs(goal[1] - y) for a in dx])
+
+def hf_axis_dist(rows, cols, start, goal):
+    dx = [abs(goal[0] - x) for x in range(cols)]
+    return _field(rows, cols, lambda y: [max(a, abs(goal[1] - y)) for a in dx])
+
+def hf_manhattan_hex(rows, cols, start, goal):
+    dx = [goal[0] - x for x in range(cols)]
+    return _field(rows, cols, lambda y: [abs(a + (goal[1] - y)) / 2 for a in dx])
+
+def hf_delta(rows, cols, start, goal):
+    totalDist = sum((a - b) ** 2 for a, b in zip(goal, start)) ** 0.5
+    dx2 = [(x - start[0]) ** 2 for x in range(cols)]
+    return _field(rows, cols, lambda y: [abs(totalDist - (a + (y - start[1]) ** 2) ** 0.5) for a in dx2])
+
+def hf_uniform_first(rows, cols, start, goal):
+    return array('d', [0]) * (rows * cols)
+
+# Heuristics whose value depends on the start as well as the goal
+start_heuristics = {h_delta}
+
+# Batch form of each built-in heuristic
+batch_heuristics = {
+    h_pythagorean: hf_pythagorean,
+    h_manhattan: hf_manhattan,
+    h_manhattan_hex: hf_manhattan_hex,
+    h_axis_dist: hf_axis_dist,
+    h_delta: hf_delta,
+    h_uniform_first: hf_uniform_first
+}
+
+# HeuristicField holds the values of heuristic h for one (start, goal).
+# - values[i] is nan until cell i has been computed
+# - compute(i) evaluates h for cell i and memoizes the result
+# Eager fields are filled up front by the batch form, lazy fields are
+# filled one cell at a time as the search reaches them.
+class HeuristicField:
+    def __init__(self, h, rows, cols, start, goal, values = None):
+        self.h = h
+        self.rows = rows
+        self.cols = cols
+        self.start = start
+        self.goal = goal
+        self.values = array('d', [nan]) * (rows * cols) if values is None else values
+
+    def compute(self, i):
+        ret = self.values[i]
+
+        if ret != ret:
+            ret = self.h(start = self.start, goal = self.goal, v = (i % self.cols, i // self.cols))
+            self.values[i] = ret
 
-    if v.isBlocked() or v_prime.isBlocked():  # You cannot transition between blocked cells
         return ret
 
-    f_v = 1
-    f_vp = 1
+    def __getitem__(self, i):
+        return self.compute(i)
 
-    if not any(a == b for a, b in zip(s, s_prime)):  # Diagonal
-        f_v = sqrt(2)
-        f_vp = sqrt(2)
+# Build the field of heuristic h for a search from start to goal
+# map: Gridworld terrain map
+# mode: 'eager' computes every cell up front, 'lazy' computes on demand,
+#       'auto' picks eager only when the search is likely to cover a
+#       large part of the map and h has a batch form
+# Heuristics that depend on the whole map (e.g. distances.h_exact) build
+# their own field through h.field(map, start, goal), whatever the mode
+def heuristicField(h, map, start, goal, mode = 'auto'):
+    field = getattr(h, 'field', None)
+    if field is not None:
+        return field(map, start, goal)
 
-    elif v.isHighway() and v_prime.isHighway():  # On a highway
-        f_v /= 4
-        f_vp /= 4
+    rows = map.rows
+    cols = map.cols
+    batch = batch_heuristics.get(h)
 
-    f_v *= 2 if v.isHardToTraverse() else 1
-    f_vp *= 2 if v_prime.isHardToTraverse() else 1
+    if mode == 'auto':
+        d = max(abs(a - b) for a, b in zip(start, goal))
+        mode = 'eager' if batch and d * d * 8 >= rows * cols else 'lazy'
 
-    ret = f_v + f_vp
-    ret /= 2
+    if mode == 'lazy':
+        return HeuristicField(h, rows, cols, start, goal)
 
-    return ret
+    if batch:
+        values = batch(rows, cols, start, goal)
+    else:
+        values = array('d', [h(start = start, goal = goal, v = (j, i)) for i in range(rows) for j in range(cols)])
+
+    return HeuristicField(h, rows, cols, start, goal, values)
+
+def isAdmissible (hCur, hParent, cost):
+    return hParent <= cost + hCur
+
+# Cost of moving between two adjacent cells under the standard profile
+# map: Gridworld terrain map
+# s, s_prime: Tuples representing cell coordinates in (x, y)
+def cost(map, s, s_prime):
+    flags = map.flags
+    v = flags[s[1] * map.cols + s[0]]
+    v_prime = flags[s_prime[1] * map.cols + s_prime[0]]
+
+    return costmodel.STANDARD.cost(v, v_prime, s[0] != s_prime[0] and s[1] != s_prime[1])
@@ -2,8 +2,9 @@ import sys
 import os
 import math
 import gridworld
-import ai
 import a_star
+import resultcache
+import searcher
 from PyQt5.QtWidgets import * 
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
@@ -13,6 +14,9 @@ cols = 160
 w_highway = 3
 w_path = 2
 
+# Expansions per progress update while a search runs
+batch = 256
+
 class AppWindow(QMainWindow):
     __grid = None 
     __gridView = None
@@ -26,6 +30,10 @@ class AppWindow(QMainWindow):
     __heuristic = None
     __w_w1 = None
     __w_w2 = None
+    __btn_runAI = None
+    __worker = None
+    __cache = None
+    __query = None
 
     def __init__(self, parent = None):
         super().__init__(parent)
@@ -51,7 +59,7 @@ class AppWindow(QMainWindow):
 
         dialog = QFileDialog(self) 
         dialog.setViewMode(QFileDialog.List)
-        dialog.setNameFilter("Gridworld (*.gw)")
+        dialog.setNameFilters(["Gridworld (*.gw)", "Binary Gridworld (*.gwb)"])
         dialog.setDefaultSuffix("gw")
 
         self.__grid = grid
@@ -152,6 +160,7 @@ class AppWindow(QMainWindow):
         self.__w = le_w
         self.__w1 = le_w1
         self.__w2 = le_w2
+        self.__btn_runAI = btn_runAI
 
         ret.setFixedWidth(250)     
 
@@ -205,6 +214,10 @@ class AppWindow(QMainWindow):
             self.__settings_s.setVisible(i == 2)
 
     def runAI(self, event):
+        if self.__worker:  # Run AI doubles as Cancel while a search runs
+            self.__worker.requestInterruption()
+            return
+
         map = gridworld.terrain
         start = gridworld.start
         goal = gridworld.goal
@@ -213,32 +226,72 @@ class AppWindow(QMainWindow):
         algo = self.__family.checkedId()
                 
         if algo == 0: # Uniform-Cost
-            info = a_star.uniform(map, start, goal)
+            config = "uniform"
         elif algo == 1: # Weighted
             w = float(self.__w.text())
             h = self.__heuristic.currentText()
     
             if h == "Manhattan":
-                h = ai.h_manhattan
+                h = "manhattan"
             elif h == "Manhattan (Hex)":
-                h = ai.h_manhattan_hex
+                h = "manhattan_hex"
             elif h == "Axial":
-                h = ai.h_axis_dist
+                h = "axis_dist"
             elif h == "Start Delta":
-                h = ai.h_delta
+                h = "delta"
             else:
-                h = ai.h_pythagorean
+                h = "pythagorean"
 
-            info = a_star.weighted(map, start, goal, w, h)
+            config = f"weighted,h={h},w={w}"
 
         elif algo == 2: # Sequential
             w1 = float(self.__w1.text())
             w2 = float(self.__w2.text())
 
-            info = a_star.sequential(map, start, goal, w1, w2)
+            config = f"sequential,w={w1},w2={w2}"
+
+        config = searcher.parseConfig(config)
+        args = searcher.searchArgs(config)
+
+        grid.clearProgress()
 
+        # A query run before, in this session or an earlier one, is shown
+        # straight from the result cache
+        if self.__cache is None:
+            self.__cache = resultcache.ResultCache()
+
+        info = self.__cache.get(map, start, goal, config, fields = True)
         if info:
             grid.displayPathfinding(info)
+            return
+
+        self.__query = (map, start, goal, config)
+
+        worker = SearchWorker(a_star.iterSequential(map, start, goal, *args, batch = batch), self)
+        worker.progress.connect(self.showProgress)
+        worker.done.connect(self.finishAI)
+        worker.finished.connect(worker.deleteLater)
+
+        self.__worker = worker
+        self.__btn_runAI.setText("Cancel")
+        worker.start()
+
+    # Signals still queued from a search that doFileAction cancelled come
+    # from another worker than the current one (or none), and are dropped
+    def showProgress(self, expanded, opened):
+        if self.__worker is not None and self.sender() is self.__worker:
+            self.__grid.displayProgress(expanded, opened)
+
+    def finishAI(self, info):
+        if self.__worker is None or self.sender() is not self.__worker:
+            return
+
+        self.__worker = None
+        self.__btn_runAI.setText("Run AI")
+
+        if info:
+            self.__cache.put(*self.__query, info, fields = True)
+            self.__grid.displayPathfinding(info)
 
     def zoom(self, event):
         view = self.__gridView
@@ -256,6 +309,19 @@ class AppWindow(QMainWindow):
         grid = self.__grid
         ai = self.__ai
 
+        # Cancel the running search; its result is for the old map, so it
+        # is neither shown nor cached
+        if self.__worker:
+            worker = self.__worker
+            worker.progress.disconnect(self.showProgress)
+            worker.done.disconnect(self.finishAI)
+            worker.requestInterruption()
+            worker.wait()
+
+            self.__worker = None
+            self.__query = None
+            self.__btn_runAI.setText("Run AI")
+
         if t == "New":
             gridworld.initGridworld()
             grid.updateScene()
@@ -277,6 +343,31 @@ class AppWindow(QMainWindow):
 
         next(a for a in self.__filemenu.actions() if a.text() == "Save").setEnabled(True)
 
+# SearchWorker runs a search generator from a_star.iterSequential off the
+# GUI thread, emitting progress for every batch and the result when done.
+# requestInterruption() cancels the search; done then carries None.
+class SearchWorker(QThread):
+    progress = pyqtSignal(list, list)
+    done = pyqtSignal(object)
+
+    def __init__(self, search, parent = None):
+        super().__init__(parent)
+        self.__search = search
+
+    def run(self):
+        search = self.__search
+        info = None
+
+        try:
+            while not self.isInterruptionRequested():
+                self.progress.emit(*next(search))
+        except StopIteration as e:
+            info = e.value
+        finally:
+            search.close()
+
+        self.done.emit(info)
+
 class QGridScene(QGraphicsScene):
     __WIDTH = 7 
     __HEIGHT = 7
@@ -285,6 +376,10 @@ class QGridScene(QGraphicsScene):
     __start = None
     __goal = None
     __path = None
+    __progress = None
+    __overlay = None
+    __c_expanded = QColor(255, 165, 0, 110).rgba()
+    __c_opened = QColor(0, 170, 255, 110).rgba()
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -350,9 +445,35 @@ class QGridScene(QGraphicsScene):
             
             grid.addToGroup(line)
 
+        # Search progress is painted one pixel per cell and scaled up
+        progress = QImage(cols, rows, QImage.Format_ARGB32)
+        progress.fill(Qt.transparent)
+
+        overlay = QGraphicsPixmapItem(QPixmap.fromImage(progress))
+        overlay.setTransform(QTransform.fromScale(self.__WIDTH, self.__HEIGHT))
+        overlay.setZValue(0.5)
+        self.addItem(overlay)
+
         self.__cells = cells
         self.__highways = highways
         self.__path = path
+        self.__progress = progress
+        self.__overlay = overlay
+
+    def clearProgress(self):
+        self.__progress.fill(Qt.transparent)
+        self.__overlay.setPixmap(QPixmap.fromImage(self.__progress))
+
+    # Paint cells added to the open list and expanded since the last batch
+    def displayProgress(self, expanded, opened):
+        progress = self.__progress
+
+        for c, group in ((self.__c_opened, opened), (self.__c_expanded, expanded)):
+            for x, y in group:
+                if 0 < x <= cols and 0 < y <= rows:
+                    progress.setPixel(x - 1, y - 1, c)
+
+        self.__overlay.setPixmap(QPixmap.fromImage(progress))
 
     def updateScene(self):
         self.__start.setPos((gridworld.start[0] - 1) * self.__WIDTH, (gridworld.start[1] - 1) * self.__HEIGHT)
@@ -360,6 +481,7 @@ class QGridScene(QGraphicsScene):
 
         self.__start.setVisible(True)
         self.__goal.setVisible(True)
+        self.clearProgress()
         
         for c in self.__path.childItems():
             self.removeItem(c)
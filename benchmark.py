@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import a_star
+import distances
+import gridworld
+import informed_search
+import parallel
+import resultcache
+import wavefront
+
+#-------------Benchmarks--------------
+# NOTE: Runs the A* variants over the bundled maps and over maps generated
+#       by gridworld.generateGridworld from a fixed seed, so every run measures
+#       the same queries. Results can be saved as a baseline and later
+#       runs compared against it, e.g.
+#
+#       python benchmark.py --save-baseline baseline.json
+#       python benchmark.py --baseline baseline.json --threshold 0.2
+#
+#       With --check, the same queries check that the configurations that
+#       promise optimal paths find paths as cheap as uniform cost search,
+#       and that wavefront distance fields match a Dijkstra search.
+
+BUNDLED = ('loadtest.gw', 'test1.gw', 'test2.gw', 'test3.gw', 'test4.gw', 'test5.gw')
+SIZES = ((120, 160), (240, 320), (480, 640))
+LARGE_SIZES = ((1000, 1000), (2000, 2000))
+# 'parallel' is left out: which queue finds its path, and so its cost and
+# expansions, depends on process timing
+CONFIGS = ('default', 'uniform', 'uniform,bidirectional', 'weighted,w=2', 'default,expand=highway', 'sequential')
+
+# Configurations whose path costs must equal those of uniform cost search
+EXACT_CONFIGS = ('uniform,expand=jump', 'weighted,h=exact,w=1,expand=jump', 'uniform,expand=highway', 'weighted,h=exact,w=1,expand=highway', 'uniform,open=bucket', 'weighted,h=exact,w=1,open=bucket', 'uniform,bidirectional,open=bucket')
+
+# Metrics where a higher value than the baseline is a regression
+METRICS = ('time', 'expansions', 'peak_kb')
+
+# Parse a size of the form ROWSxCOLS
+def parseSize(text):
+    rows, _, cols = text.partition('x')
+    return int(rows), int(cols)
+
+# Yields (name, terrain, start, goal) for every benchmark map
+# maps: Paths of .gw files, relative paths are looked up next to this file
+# sizes: (rows, cols) of the maps to generate
+# seed: Seed of the generated maps
+def loadMaps(maps, sizes, seed):
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    for path in maps:
+        terrain, start, goal, _, _ = gridworld.readGridworld(os.path.join(here, path))
+        yield os.path.basename(path), terrain, start, goal
+
+    for rows, cols in sizes:
+        terrain, start, goal, _, _ = gridworld.generateGridworld(rows, cols, seed)
+        yield f"{rows}x{cols}@{seed}", terrain, start, goal
+
+# Run one query repeat times and measure it
+# Returns a dict of metrics; time is the fastest run, queue_expansions
+# splits the expansions by queue (e.g. forward and backward), and
+# peak_kb comes from one extra run under tracemalloc (which would skew
+# the timings)
+def measure(terrain, start, goal, config, repeat = 3, memory = True):
+    times = []
+    info = None
+
+    for _ in range(repeat):
+        t = time.perf_counter()
+        info = informed_search.search(terrain, start, goal, config)
+        times.append(time.perf_counter() - t)
+
+    peak = None
+    if memory:
+        peak = informed_search.runQuery('', terrain, start, goal, config)['peak_kb']
+
+    t = min(times)
+    expansions = info['expansions'] if info else 0
+
+    return {
+        'time': t,
+        'expansions': expansions,
+        'queue_expansions': info['stats'].expansions if info else None,
+        'nodes_per_s': expansions / t if t > 0 else None,
+        'cost': info['cost'] if info else None,
+        'peak_kb': peak
+    }
+
+# Run every configuration on every map
+# Returns {case: metrics} where case is "map:config"
+def runBenchmarks(maps, sizes, configs, seed = 0, repeat = 3, memory = True, out = sys.stdout):
+    ret = {}
+
+    for name, terrain, start, goal in loadMaps(maps, sizes, seed):
+        for text in configs:
+            case = f"{name}:{text}"
+            ret[case] = measure(terrain, start, goal, informed_search.parseConfig(text), repeat, memory)
+
+            if out:
+                r = ret[case]
+                peak = '-' if r['peak_kb'] is None else f"{r['peak_kb']} KB"
+                out.write(f"{case:40} {r['time'] * 1000:10.1f} ms {r['expansions']:10} exp {r['nodes_per_s'] or 0:12.0f} exp/s {peak:>12}\n")
+                out.flush()
+
+        parallel.closeSearchers(terrain)
+
+    return ret
+
+# Compare results against a baseline
+# threshold: Allowed relative increase of each metric, e.g. 0.2 for +20%
+# Returns a list of human-readable regressions. Path costs and expansions
+# of configurations whose results vary between runs (see
+# resultcache.cacheable) are not compared.
+def compare(results, baseline, threshold = 0.1):
+    ret = []
+
+    for case, r in results.items():
+        b = baseline.get(case)
+        if b is None:
+            continue
+
+        stable = resultcache.cacheable(informed_search.parseConfig(case.split(':', 1)[1]))
+
+        if stable and b.get('cost') != r.get('cost'):
+            ret.append(f"{case}: path cost changed from {b.get('cost')} to {r.get('cost')}")
+
+        for m in METRICS:
+            if r.get(m) is None or not b.get(m) or (m == 'expansions' and not stable):
+                continue
+
+            if r[m] > b[m] * (1 + threshold):
+                ret.append(f"{case}: {m} regressed by {(r[m] / b[m] - 1) * 100:.1f}% ({b[m]} -> {r[m]})")
+
+    return ret
+
+# Whether two path costs (or None for no path) agree up to rounding
+def sameCost(a, b):
+    return a == b or (a is not None and b is not None and abs(a - b) <= 1e-9 * max(1, abs(b)))
+
+# Compare configurations against uniform cost search on every map
+# Returns a list of human-readable mismatches
+def checkCosts(maps, sizes, configs = EXACT_CONFIGS, seed = 0, out = sys.stdout):
+    ret = []
+
+    for name, terrain, start, goal in loadMaps(maps, sizes, seed):
+        expected = a_star.uniform(terrain, start, goal)
+        expected = expected['cost'] if expected else None
+
+        for text in configs:
+            info = informed_search.search(terrain, start, goal, informed_search.parseConfig(text))
+            cost = info['cost'] if info else None
+
+            if not sameCost(cost, expected):
+                ret.append(f"{name}:{text}: path cost {cost}, uniform cost search found {expected}")
+
+            if out:
+                out.write(f"{name + ':' + text:40} {cost} (uniform {expected})\n")
+                out.flush()
+
+    return ret
+
+# Compare the wavefront distance field of each method that can run here
+# against a backward Dijkstra (distances.costToGoal) on every map
+# Returns a list of human-readable mismatches
+def checkFields(maps, sizes, seed = 0, out = sys.stdout):
+    methods = [m for m in wavefront.METHODS if m != 'auto' and (m != 'sweep' or wavefront.numpy is not None)]
+    ret = []
+
+    if out and 'sweep' not in methods:
+        out.write("wavefront 'sweep' skipped, NumPy is not installed\n")
+
+    for name, terrain, start, goal in loadMaps(maps, sizes, seed):
+        expected = distances.costToGoal(terrain, goal).dist
+
+        for method in methods:
+            field = wavefront.distanceField(terrain, goal, method = method)
+            wrong = sum(not sameCost(a, b) for a, b in zip(field, expected))
+
+            if wrong:
+                ret.append(f"{name}:wavefront,{method}: {wrong} cells differ from Dijkstra")
+
+            if out:
+                out.write(f"{name + ':wavefront,' + method:40} {wrong} cells differ\n")
+                out.flush()
+
+    return ret
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark the A* variants on bundled and seeded maps")
+    parser.add_argument('--maps', nargs = '*', default = list(BUNDLED), help = "Gridworld files (default: bundled maps)")
+    parser.add_argument('--sizes', nargs = '*', type = parseSize, default = list(SIZES), help = "Generated map sizes as ROWSxCOLS")
+    parser.add_argument('--large', action = 'store_true', help = "Also generate " + ', '.join(f"{r}x{c}" for r, c in LARGE_SIZES) + " maps")
+    parser.add_argument('--configs', nargs = '*', default = list(CONFIGS), help = "Search configurations, see informed_search run -c")
+    parser.add_argument('--seed', type = int, default = 0, help = "Seed of the generated maps")
+    parser.add_argument('--repeat', type = int, default = 3, help = "Timed runs per query, the fastest is kept")
+    parser.add_argument('--no-memory', action = 'store_false', dest = 'memory', help = "Skip the tracemalloc run")
+    parser.add_argument('--baseline', help = "Baseline JSON to compare against")
+    parser.add_argument('--threshold', type = float, default = 0.1, help = "Allowed relative regression (default: 0.1)")
+    parser.add_argument('--save-baseline', help = "Write the results as a baseline JSON")
+    parser.add_argument('--check', action = 'store_true', help = "Check path costs of the optimal configurations and wavefront fields instead of timing")
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes + (list(LARGE_SIZES) if args.large else [])
+
+    if args.check:
+        mismatches = checkCosts(args.maps, sizes, seed = args.seed) + checkFields(args.maps, sizes, args.seed)
+
+        for m in mismatches:
+            print("MISMATCH", m)
+
+        return 1 if mismatches else 0
+    results = runBenchmarks(args.maps, sizes, args.configs, args.seed, args.repeat, args.memory)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'python': platform.python_version(), 'seed': args.seed, 'results': results}, f, indent = 1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+
+        for r in regressions:
+            print("REGRESSION", r)
+
+        return 1 if regressions else 0
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import gridworld
+from math import inf, sqrt
+from array import array
+
+#-------------Edge cost model--------------
+# NOTE: Edge costs are precomputed once per terrain into one array per
+#       direction, so the search reads costs[d][i] instead of calling
+#       ai.cost on every relaxation. Blocked (or disallowed) edges are inf.
+
+# The 8 neighbour directions as (dx, dy); diagonals are the ones
+# where both components are non-zero
+DIRECTIONS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+# Direction index of each (dx, dy)
+DIRECTION_INDEX = {d: e for e, d in enumerate(DIRECTIONS)}
+
+# A cost profile turns the flags of two adjacent cells into an edge cost.
+# Profiles compare equal when their parameters are equal, so they can be
+# used to key cached tables.
+class CostProfile:
+    def cost(self, v, v_prime, diagonal):
+        raise NotImplementedError
+
+    def params(self):
+        return ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.params() == other.params()
+
+    def __hash__(self):
+        return hash((type(self), self.params()))
+
+    def __repr__(self):
+        return f"{type(self).__name__}{self.params()}"
+
+# Rules from section 2 of assignment.pdf:
+# - The cost of an edge is the average of the cost of both cells
+# - Diagonal moves cost sqrt(2) instead of 1
+# - Straight moves between two highway cells cost highway times as much
+# - Hard to traverse cells cost hard times as much
+class StandardCost(CostProfile):
+    def __init__(self, highway = 0.25, hard = 2, diagonal = True):
+        self.highway = highway
+        self.hard = hard
+        self.diagonal = diagonal
+
+    def params(self):
+        return (self.highway, self.hard, self.diagonal)
+
+    def cost(self, v, v_prime, diagonal):
+        if (v | v_prime) & gridworld.BLOCKED:  # You cannot transition between blocked cells
+            return inf
+
+        if diagonal and not self.diagonal:
+            return inf
+
+        f_v = 1
+        f_vp = 1
+
+        if diagonal:
+            f_v = sqrt(2)
+            f_vp = sqrt(2)
+
+        elif v & v_prime & gridworld.HIGHWAY:  # On a highway
+            f_v *= self.highway
+            f_vp *= self.highway
+
+        f_v *= self.hard if v & gridworld.HARD else 1
+        f_vp *= self.hard if v_prime & gridworld.HARD else 1
+
+        return (f_v + f_vp) / 2
+
+# 4-connected variant of the standard rules
+class FourConnected(StandardCost):
+    def __init__(self, highway = 0.25, hard = 2):
+        super().__init__(highway, hard, False)
+
+STANDARD = StandardCost()
+
+# EdgeCosts holds the cost of every edge of a terrain under one profile.
+# - offsets[d]: flat index delta for direction d
+# - costs[d][i]: cost of moving from cell i in direction d
+# The table patches itself when a cell of the terrain changes.
+class EdgeCosts:
+    def __init__(self, terrain, profile = STANDARD):
+        self.terrain = terrain
+        self.profile = profile
+        self.offsets = tuple(dy * terrain.cols + dx for dx, dy in DIRECTIONS)
+
+        # Edge cost by (flags of v, flags of v'), one table per diagonality
+        self.__lut = [
+            [profile.cost(a, b, diagonal) for a in range(8) for b in range(8)]
+            for diagonal in (False, True)
+        ]
+
+        self.costs = [self.__build(d) for d in range(len(DIRECTIONS))]
+        terrain.watch(self.update)
+
+    def __build(self, d):
+        terrain = self.terrain
+        rows = terrain.rows
+        cols = terrain.cols
+        n = rows * cols
+        flags = terrain.flags
+        dx, dy = DIRECTIONS[d]
+        o = self.offsets[d]
+        lut = self.__lut[dx != 0 and dy != 0]
+
+        # Only cells whose neighbour in direction d exists get a cost
+        lo = max(0, -o)
+        hi = min(n, n - o)
+        ret = array('d', [inf]) * lo
+        ret += array('d', [lut[a << 3 | b] for a, b in zip(flags[lo:hi], flags[lo + o:hi + o])])
+        ret += array('d', [inf]) * (n - hi)
+
+        # Neighbours across the left/right edge would wrap onto another row
+        if dx:
+            x = 0 if dx < 0 else cols - 1
+            for y in range(rows):
+                ret[y * cols + x] = inf
+
+        return ret
+
+    def cost(self, i, d):
+        return self.costs[d][i]
+
+    # Recompute every edge touching cell i
+    def update(self, i):
+        terrain = self.terrain
+        cols = terrain.cols
+        flags = terrain.flags
+        x = i % cols
+        y = i // cols
+
+        for d, (dx, dy) in enumerate(DIRECTIONS):
+            lut = self.__lut[dx != 0 and dy != 0]
+            x_p = x + dx
+            y_p = y + dy
+
+            if not (0 <= x_p < cols and 0 <= y_p < terrain.rows):
+                continue
+
+            j = y_p * cols + x_p
+            c = lut[flags[i] << 3 | flags[j]]
+            self.costs[d][i] = c
+            self.costs[7 - d][j] = c  # DIRECTIONS[7 - d] is the opposite of d
+
+    def close(self):
+        self.terrain.unwatch(self.update)
+
+# Edge cost table for a terrain, built on first use and cached on the
+# terrain for each profile
+def edgeCosts(terrain, profile = None):
+    profile = profile or STANDARD
+    tables = terrain.costTables
+
+    if profile not in tables:
+        tables[profile] = EdgeCosts(terrain, profile)
+
+    return tables[profile]
@@ -0,0 +1,135 @@
+from heapq import heappush, heappop
+from math import inf
+from array import array
+from collections import OrderedDict
+from time import perf_counter
+import ai
+import costmodel
+
+#-------------Exact cost-to-goal fields--------------
+# NOTE: A backward Dijkstra from the goal gives the exact cost from every
+#       cell to the goal. That is a perfect heuristic for weighted A*
+#       (the geometric heuristics in ai.py are not even admissible on
+#       highways, where a step costs 0.25), and it answers any query to
+#       the same goal by following successor pointers.
+
+# GoalDistances holds the result of one backward Dijkstra
+# - dist[i]: Cost of the cheapest path from cell i to the goal, inf if none
+# - next[i]: Next cell on that path, -1 at the goal or if unreachable
+class GoalDistances:
+    def __init__(self, terrain, goal, dist, next, time = 0.0):
+        self.terrain = terrain
+        self.goal = tuple(goal)
+        self.dist = dist
+        self.next = next
+        self.time = time
+
+    def cost(self, start):
+        return self.dist[start[1] * self.terrain.cols + start[0]]
+
+    # Path of (x, y) tuples from start to the goal, None if unreachable
+    def path(self, start):
+        cols = self.terrain.cols
+        i = start[1] * cols + start[0]
+
+        if self.dist[i] == inf:
+            return None
+
+        ret = []
+        while i != -1:
+            ret.append((i % cols, i // cols))
+            i = self.next[i]
+
+        return ret
+
+# Backward Dijkstra from goal over the edge cost table of a profile
+# Edges are followed in reverse (from m to m + offset), so asymmetric
+# profiles are handled as well
+def costToGoal(terrain, goal, profile = None):
+    t = perf_counter()
+    edges = costmodel.edgeCosts(terrain, profile)
+    size = terrain.rows * terrain.cols
+    neighbours = tuple(zip(edges.offsets, edges.costs))
+    dist = array('d', [inf]) * size
+    next = array('i', [-1]) * size
+    g = goal[1] * terrain.cols + goal[0]
+
+    dist[g] = 0
+    heap = [(0, g)]
+
+    while heap:
+        d, n = heappop(heap)
+
+        if d > dist[n]:
+            continue
+
+        for o, c in neighbours:
+            m = n - o
+
+            if 0 <= m < size:
+                d_m = d + c[m]
+
+                if d_m < dist[m]:
+                    dist[m] = d_m
+                    next[m] = n
+                    heappush(heap, (d_m, m))
+
+    return GoalDistances(terrain, goal, dist, next, perf_counter() - t)
+
+# DistanceCache keeps the GoalDistances of the most recently used goals
+# of one terrain. Any edit to the terrain empties the cache.
+class DistanceCache:
+    def __init__(self, terrain, profile = None, maxsize = 16):
+        self.terrain = terrain
+        self.profile = profile
+        self.maxsize = maxsize
+        self.version = terrain.version
+        self.entries = OrderedDict()
+
+    def get(self, goal):
+        goal = tuple(goal)
+        entries = self.entries
+
+        if self.version != self.terrain.version:
+            entries.clear()
+            self.version = self.terrain.version
+
+        if goal in entries:
+            entries.move_to_end(goal)
+        else:
+            entries[goal] = costToGoal(self.terrain, goal, self.profile)
+
+            if len(entries) > self.maxsize:
+                entries.popitem(last = False)
+
+        return entries[goal]
+
+# Costs to goal from the DistanceCache kept on the terrain for each profile
+def goalDistances(terrain, goal, profile = None):
+    if profile is None:
+        profile = costmodel.STANDARD
+
+    caches = terrain.distanceCaches
+
+    if profile not in caches:
+        caches[profile] = DistanceCache(terrain, profile)
+
+    return caches[profile].get(goal)
+
+# ExactHeuristic uses the exact cost to the goal as its value, through
+# the shared cache. It only has a field form (see ai.heuristicField),
+# since a value depends on the whole map.
+class ExactHeuristic:
+    admissible = True
+
+    def __init__(self, profile = None):
+        self.profile = profile
+
+    def field(self, map, start, goal):
+        d = goalDistances(map, goal, self.profile)
+        return ai.HeuristicField(self, map.rows, map.cols, start, goal, d.dist)
+
+    def __repr__(self):
+        return f"ExactHeuristic({self.profile})"
+
+h_exact = ExactHeuristic()
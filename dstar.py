@@ -0,0 +1,202 @@
+from heapq import heappush, heappop
+from math import inf
+from array import array
+from time import perf_counter
+import a_star
+import costmodel
+
+#-------------Incremental replanning (D* Lite)--------------
+# NOTE: Planner searches backwards from the goal and keeps its g and rhs
+#       values between calls. When cells change, only the vertices whose
+#       cheapest path went through them are repaired, which on a map that
+#       changes a few cells at a time is far less work than a new search.
+#       Changed cells are collected with Terrain.track, so edits made
+#       through Vertex.markBlocked, markHighway, etc. are picked up by the
+#       next plan(). The start may move along the path (D* Lite), the goal
+#       is fixed.
+
+class Planner:
+    # terrain: Gridworld terrain map
+    # start, goal: Tuples representing coordinates in (x, y)
+    # profile: Edge cost profile, default costmodel.STANDARD
+    def __init__(self, terrain, start, goal, profile = None):
+        profile = profile or costmodel.STANDARD
+        size = terrain.rows * terrain.cols
+
+        self.terrain = terrain
+        self.edges = costmodel.edgeCosts(terrain, profile)
+        self.neighbours = tuple(zip(self.edges.offsets, self.edges.costs))
+        self.start = start[1] * terrain.cols + start[0]
+        self.last = self.start
+        self.goal = goal[1] * terrain.cols + goal[0]
+        self.g = array('d', [inf]) * size
+        self.rhs = array('d', [inf]) * size
+        self.km = 0
+
+        # Live key of each open vertex, and a heap that may hold stale keys
+        self.open = {}
+        self.heap = []
+
+        # Cheapest straight and diagonal step of the profile; a diagonal
+        # step never needs to cost more than two straight ones
+        self.straight = min(profile.cost(a, b, False) for a in range(8) for b in range(8))
+        self.diagonal = min(2 * self.straight, min(profile.cost(a, b, True) for a in range(8) for b in range(8)))
+
+        self.dirty = terrain.track()
+
+        self.rhs[self.goal] = 0
+        self.__push(self.goal)
+
+    def close(self):
+        self.dirty.close()
+
+    # Lower bound on the cost between cells i and j
+    def bound(self, i, j):
+        cols = self.terrain.cols
+        dx = abs(i % cols - j % cols)
+        dy = abs(i // cols - j // cols)
+
+        return self.straight * abs(dx - dy) + self.diagonal * min(dx, dy)
+
+    def key(self, i):
+        m = min(self.g[i], self.rhs[i])
+        return (m + self.bound(i, self.start) + self.km, m)
+
+    def __push(self, i):
+        k = self.key(i)
+        self.open[i] = k
+        heappush(self.heap, (k, i))
+
+    # Recompute rhs of cell i from its neighbours and queue it if it is
+    # inconsistent
+    def updateVertex(self, i):
+        if i != self.goal:
+            g = self.g
+            rhs = inf
+
+            for o, c in self.neighbours:
+                c = c[i]
+                if c < inf and c + g[i + o] < rhs:
+                    rhs = c + g[i + o]
+
+            self.rhs[i] = rhs
+
+        if self.g[i] != self.rhs[i]:
+            self.__push(i)
+        else:
+            self.open.pop(i, None)
+
+    # Cells whose edges into cell i may have changed
+    def __around(self, i):
+        size = len(self.g)
+        return [i + o for o in self.edges.offsets if 0 <= i + o < size]
+
+    # Returns the number of expansions
+    def computeShortestPath(self):
+        g = self.g
+        rhs = self.rhs
+        heap = self.heap
+        open = self.open
+        s = self.start
+        expansions = 0
+
+        while heap:
+            k_old, u = heap[0]
+
+            if open.get(u) != k_old:
+                heappop(heap)
+                continue
+
+            if k_old >= self.key(s) and rhs[s] == g[s]:
+                break
+
+            heappop(heap)
+            k_new = self.key(u)
+
+            if k_old < k_new:
+                open[u] = k_new
+                heappush(heap, (k_new, u))
+                continue
+
+            del open[u]
+            expansions += 1
+
+            if g[u] > rhs[u]:
+                g[u] = rhs[u]
+
+                for o, c in self.neighbours:
+                    if c[u] < inf:
+                        self.updateVertex(u + o)
+            else:
+                g[u] = inf
+                self.updateVertex(u)
+
+                for o, c in self.neighbours:
+                    if c[u] < inf:
+                        self.updateVertex(u + o)
+
+        return expansions
+
+    # Move the start, e.g. as an agent walks the path
+    def moveStart(self, start):
+        i = start[1] * self.terrain.cols + start[0]
+        self.km += self.bound(self.last, i)
+        self.last = i
+        self.start = i
+
+    # Plan (or repair) the path from the start to the goal
+    # changed: Indices of changed cells, on top of those the terrain reported
+    # Returns a dict with the path ('map'), its 'cost', the number of
+    # 'expansions' of this call and the SearchStats ('stats'), or None if
+    # the goal cannot be reached
+    def plan(self, changed = ()):
+        t = perf_counter()
+
+        cells = self.dirty.take()
+        cells.update(changed)
+        for i in cells:
+            for j in [i] + self.__around(i):
+                self.updateVertex(j)
+
+        stats = a_star.SearchStats(1)
+        stats.expansions[0] = self.computeShortestPath()
+
+        path = self.path()
+        stats.search_time = perf_counter() - t
+
+        if path is None:
+            return None
+
+        return {
+            'map': path,
+            'cost': self.g[self.start],
+            'stats': stats,
+            'expansions': stats.totalExpansions()
+        }
+
+    # Path of (x, y) tuples from the start to the goal by following the
+    # cheapest neighbours, None if the goal cannot be reached
+    def path(self):
+        cols = self.terrain.cols
+        g = self.g
+        i = self.start
+
+        if g[i] == inf:
+            return None
+
+        ret = [(i % cols, i // cols)]
+        while i != self.goal and len(ret) <= len(g):
+            best = inf
+            for o, c in self.neighbours:
+                c = c[i]
+                if c < inf and c + g[i + o] < best:
+                    best = c + g[i + o]
+                    n = i + o
+
+            if best == inf:
+                return None
+
+            i = n
+            ret.append((i % cols, i // cols))
+
+        return ret
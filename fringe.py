@@ -0,0 +1,227 @@
+from heapq import heappush, heappop
+from math import inf
+from array import array
+
+#-------------Open list (fringe) implementations--------------
+# NOTE: Items are flat cell indices (y * cols + x), so every
+#       fringe can keep a per-cell array instead of a dict or
+#       an O(n) scan through its queue.
+
+# OpenSet is a lazy-deletion binary heap with decrease-key.
+# - key[i] holds the live priority of cell i, or inf if it is not open
+# - Stale heap entries (whose priority no longer matches key[i]) are
+#   discarded when they reach the top of the heap
+# push() both inserts and decreases a key, so membership never has to
+# be checked by the caller.
+class OpenSet:
+    def __init__(self, size):
+        self.key = array('d', [inf]) * size
+        self.heap = []
+        self.count = 0
+
+        # Heap operations, including pops of stale entries
+        self.pushes = 0
+        self.pops = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, i):
+        return self.key[i] < inf
+
+    # Insert cell i with priority k, or move it to k if it is already open
+    def push(self, i, k):
+        if self.key[i] == inf:
+            self.count += 1
+
+        self.key[i] = k
+        self.pushes += 1
+        heappush(self.heap, (k, i))
+
+    # Remove and return the (key, cell) pair with the smallest key
+    def pop(self):
+        heap = self.heap
+        key = self.key
+
+        while heap:
+            k, i = heappop(heap)
+            self.pops += 1
+
+            if key[i] == k:
+                key[i] = inf
+                self.count -= 1
+                return k, i
+
+        raise IndexError("pop from an empty OpenSet")
+
+    # Smallest live key, or inf if the set is empty
+    def minKey(self):
+        heap = self.heap
+        key = self.key
+
+        while heap:
+            k, i = heap[0]
+
+            if key[i] == k:
+                return k
+
+            heappop(heap)
+            self.pops += 1
+
+        return inf
+
+    # Empty the set in O(entries) rather than O(cells), so it can be reused
+    def clear(self):
+        key = self.key
+        for _, i in self.heap:
+            key[i] = inf
+
+        self.heap = []
+        self.count = 0
+        self.pushes = 0
+        self.pops = 0
+
+    # Drop cell i from the set without popping it
+    def remove(self, i):
+        if self.key[i] < inf:
+            self.key[i] = inf
+            self.count -= 1
+
+    # Open cells, in no particular order
+    def cells(self):
+        key = self.key
+        return {i for k, i in self.heap if key[i] == k}
+
+# BucketOpenSet keeps its entries in buckets of keys width apart, so a
+# push only touches the (small) heap of one bucket instead of a heap of
+# the whole fringe. Edge costs come from a handful of values, so keys
+# spread over many buckets with few entries each.
+# - buckets[b] is a heap of (key, cell) entries with int(key / width) == b
+# - low is at or below the lowest non-empty bucket; it only moves back
+#   when a key smaller than every open one is pushed (e.g. a reopening)
+# - last holds the entries of infinite key, after every bucket
+# Entries within a bucket are ordered as in OpenSet, so both pop the
+# same cells in the same order. key, push, pop, minKey, clear and
+# remove behave as in OpenSet.
+class BucketOpenSet:
+    def __init__(self, size, width = 0.25):
+        self.key = array('d', [inf]) * size
+        self.scale = 1 / width
+        self.buckets = []
+        self.last = []
+        self.low = 0
+        self.count = 0
+
+        # Bucket operations, including pops of stale entries
+        self.pushes = 0
+        self.pops = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, i):
+        return self.key[i] < inf
+
+    def push(self, i, k):
+        if self.key[i] == inf:
+            self.count += 1
+
+        self.key[i] = k
+        self.pushes += 1
+
+        if k == inf:
+            heappush(self.last, (k, i))
+            return
+
+        b = int(k * self.scale)
+        buckets = self.buckets
+        while len(buckets) <= b:
+            buckets.append([])
+
+        heappush(buckets[b], (k, i))
+        if b < self.low:
+            self.low = b
+
+    # Lowest bucket with a live entry on top, or None if the set is empty
+    def __first(self):
+        buckets = self.buckets
+        b = self.low
+
+        while b < len(buckets):
+            if self.__live(buckets[b]):
+                self.low = b
+                return buckets[b]
+
+            b += 1
+
+        self.low = b
+        return self.last if self.__live(self.last) else None
+
+    # Drop stale entries from the top of bucket
+    # Returns whether a live entry is left on top
+    def __live(self, bucket):
+        key = self.key
+
+        while bucket:
+            k, i = bucket[0]
+            if key[i] == k:
+                return True
+
+            heappop(bucket)
+            self.pops += 1
+
+        return False
+
+    def pop(self):
+        bucket = self.__top()
+        if bucket is None:
+            raise IndexError("pop from an empty BucketOpenSet")
+
+        k, i = heappop(bucket)
+        self.pops += 1
+        self.key[i] = inf
+        self.count -= 1
+        return k, i
+
+    def minKey(self):
+        bucket = self.__top()
+        return inf if bucket is None else bucket[0][0]
+
+    # __first, checking the bucket at low before scanning for one
+    def __top(self):
+        buckets = self.buckets
+        low = self.low
+
+        if low < len(buckets):
+            bucket = buckets[low]
+            if bucket:
+                k, i = bucket[0]
+                if self.key[i] == k:
+                    return bucket
+
+        return self.__first()
+
+    def clear(self):
+        key = self.key
+        for bucket in self.buckets[self.low:] + [self.last]:
+            for _, i in bucket:
+                key[i] = inf
+
+        self.buckets = []
+        self.last = []
+        self.low = 0
+        self.count = 0
+        self.pushes = 0
+        self.pops = 0
+
+    def remove(self, i):
+        if self.key[i] < inf:
+            self.key[i] = inf
+            self.count -= 1
+
+    def cells(self):
+        key = self.key
+        return {i for bucket in self.buckets[self.low:] + [self.last] for k, i in bucket if key[i] == k}
+
+# Open list class of each name
+OPEN_LISTS = {'heap': OpenSet, 'bucket': BucketOpenSet}
@@ -1,250 +1,528 @@
 import random
 import math
-import os
-
-random.seed()
+import mmap
+import struct
 
 start = (-1, -1)
 goal = (-1, -1)
-terrain = []
+terrain = None
+pairs = []
 
 c_hardregions = () 
 
-# Vertex represents one cell in the terrain
-# As per the spec in the assignment, terrain is marked with a character 
+# Terrain is stored as one flat bytearray of cell codes, indexed by
+# y * cols + x. As per the spec in the assignment, terrain is marked
+# with a character
 # - 0: blocked
 # - 1: unblockd
 # - 2: hard to traverse
 # - a: unblocked highway
 # - b: hard to traverse highway
+# A parallel bytearray of flags is kept for the search, so checking a
+# cell is a single index instead of a chain of string comparisons.
+# The codes can live in any byte buffer (e.g. a memoryview of shared
+# memory), so a map can be shared between processes without copying.
+BLOCKED = 1
+HIGHWAY = 2
+HARD = 4
+
+FLAGS = bytearray(256)
+FLAGS[ord('0')] = BLOCKED
+FLAGS[ord('2')] = HARD
+FLAGS[ord('a')] = HIGHWAY
+FLAGS[ord('b')] = HIGHWAY | HARD
+FLAGS = bytes(FLAGS)
+
+class Terrain:
+    def __init__(self, rows, cols, codes = None):
+        if codes is None:
+            codes = bytearray(b'0' * (rows * cols))
+        elif len(codes) != rows * cols:
+            raise ValueError(f"Expected {rows * cols} cells, got {len(codes)}")
+
+        self.rows = rows
+        self.cols = cols
+        self.codes = codes
+        self.flags = bytearray(bytes(codes).translate(FLAGS))
+
+        # Bumped on every edit; watchers are called with the edited index
+        self.version = 0
+        self.watchers = []
+
+        # Edge cost tables by cost profile, see costmodel.edgeCosts
+        self.costTables = {}
+
+        # Goal distance caches by cost profile, see distances.goalDistances
+        self.distanceCaches = {}
+
+        # Landmarks by (k, method, profile), see landmarks.landmarksFor
+        self.landmarkTables = {}
+
+        # Jump tables by cost profile, see jps.jumpTable
+        self.jumpTables = {}
+
+        # Cluster hierarchies by (size, profile), see hpa.hierarchy
+        self.hierarchies = {}
+
+        # Highway overlays by cost profile, see highways.highwayOverlay
+        self.highwayOverlays = {}
+
+        # Parallel searchers by (heuristics, profile), see
+        # parallel.parallelSearcher
+        self.parallelSearchers = {}
+
+    # Build a terrain from a list of equal length code strings
+    @classmethod
+    def fromRows(cls, rows):
+        if any(len(row) != len(rows[0]) for row in rows):
+            raise ValueError("Terrain rows must all be the same length")
+
+        return cls(len(rows), len(rows[0]) if rows else 0, bytearray(''.join(rows).encode('ascii')))
+
+    def index(self, x, y):
+        return y * self.cols + x
+
+    def code(self, i):
+        return chr(self.codes[i])
+
+    def setCode(self, i, c):
+        c = ord(c)
+        if self.codes[i] == c:
+            return
+
+        self.codes[i] = c
+        self.markDirty(i)
+
+    # Tell every watcher that cell i changed. setCode does this already;
+    # call it after writing to the codes buffer directly.
+    def markDirty(self, i):
+        self.flags[i] = FLAGS[self.codes[i]]
+        self.version += 1
+
+        for fn in self.watchers:
+            fn(i)
+
+    # Call fn(i) whenever cell i changes
+    def watch(self, fn):
+        self.watchers.append(fn)
+
+    def unwatch(self, fn):
+        self.watchers.remove(fn)
+
+    # Collect the cells that change from now on, see DirtyCells
+    def track(self):
+        return DirtyCells(self)
+
+    # Thin list-of-lists style access for the GUI: terrain[y][x] is a Vertex
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, y):
+        if not 0 <= y < self.rows:
+            raise IndexError("terrain row out of range")
+
+        return TerrainRow(self, y)
+
+    def __iter__(self):
+        return (TerrainRow(self, y) for y in range(self.rows))
+
+    def __repr__(self):
+        cols = self.cols
+        return '\n'.join(bytes(self.codes[y * cols:(y + 1) * cols]).decode('ascii') for y in range(self.rows))
+
+# DirtyCells collects the indices of changed cells until they are taken,
+# for consumers that repair their state in batches (e.g. dstar.Planner)
+class DirtyCells:
+    def __init__(self, terrain):
+        self.terrain = terrain
+        self.cells = set()
+        terrain.watch(self.add)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def add(self, i):
+        self.cells.add(i)
+
+    # Return the changed cells and start collecting anew
+    def take(self):
+        ret = self.cells
+        self.cells = set()
+        return ret
+
+    def close(self):
+        self.terrain.unwatch(self.add)
+
+class TerrainRow:
+    __slots__ = ('terrain', 'offset')
+
+    def __init__(self, terrain, y):
+        self.terrain = terrain
+        self.offset = y * terrain.cols
+
+    def __len__(self):
+        return self.terrain.cols
+
+    def __getitem__(self, x):
+        if isinstance(x, slice):
+            return [Vertex(self.terrain, self.offset + j) for j in range(*x.indices(self.terrain.cols))]
+
+        if not 0 <= x < self.terrain.cols:
+            raise IndexError("terrain column out of range")
+
+        return Vertex(self.terrain, self.offset + x)
+
+    def __iter__(self):
+        return (Vertex(self.terrain, self.offset + x) for x in range(self.terrain.cols))
+
+# Vertex is a view of one cell in the terrain
 # Helper methods are provided to make getting info easier, 
 # as well as highway marking
 
 class Vertex:
-    __code = '1'
-    
-    def __init__(self, c):
-        self.__code = c
+    __slots__ = ('terrain', 'i')
+
+    def __init__(self, terrain, i):
+        self.terrain = terrain
+        self.i = i
 
     def isHighway(self):
-        return self.__code == 'a' or self.__code == 'b'
+        return bool(self.terrain.flags[self.i] & HIGHWAY)
     
     def isBlocked(self):
-        return self.__code == '0'
+        return bool(self.terrain.flags[self.i] & BLOCKED)
 
     def isUnblocked(self):
-        return self.__code == '1' or self.__code == 'a'
+        return self.terrain.code(self.i) in '1a'
 
     def isHardToTraverse(self):
-        return self.__code == '2' or self.__code == 'b'
+        return bool(self.terrain.flags[self.i] & HARD)
 
     def markHighway(self):
-        if self.__code == '1':
-            self.__code = 'a'
-        elif self.__code == '2':
-            self.__code = 'b'
+        c = self.terrain.code(self.i)
+        if c == '1':
+            self.terrain.setCode(self.i, 'a')
+        elif c == '2':
+            self.terrain.setCode(self.i, 'b')
 
     def unmarkHighway(self):
-        if self.__code == 'a':
-            self.__code = '1'
-        elif self.__code == 'b':
-            self.__code = '2' 
+        c = self.terrain.code(self.i)
+        if c == 'a':
+            self.terrain.setCode(self.i, '1')
+        elif c == 'b':
+            self.terrain.setCode(self.i, '2')
 
     def markUnblocked(self):
-        self.__code = '1'
+        self.terrain.setCode(self.i, '1')
 
     def markHardToTraverse(self):
-        self.__code = '2'
+        self.terrain.setCode(self.i, '2')
  
     def markBlocked(self):
-        self.__code = '0'   
+        self.terrain.setCode(self.i, '0')
+
+    def markDirty(self):
+        self.terrain.markDirty(self.i)
     
     def __repr__(self): 
-        return f"{self.__code}"
+        return self.terrain.code(self.i)
 
 # Init terrain as follows:
 # - Define a grid map 1 cell bigger with all blocked cells
-# - Create a slice within the map that represents the inner area; modify this slice only
-# - Select 8 random regions to be partially blocked
+# - Unblock the inner area; only this area is modified
+# - Select 8 random regions to be partially hard to traverse
 # - Create 4 highways
 # - Select 20% of the total number of cells to be blocked cells
 # For more information, see section 2 of assignment.pdf
-def initTerrain(rows = 120, cols = 160):
-    # Save total number of cells for later use
-    size = rows * cols
-    
-    # Initialize cells to be blocked 
-    ret = [[Vertex('0') for _ in range(cols + 2)] for _ in range(rows + 2)] 
- 
-    # Select the internal section to be unblocked.
-    # We will modify this map.
-    t = [[ret[i][j] for j in range(1, cols + 1)] for i in range(1, rows + 1)]
-    for row in t:
-        for v in row:
-            v.markUnblocked()    
-
-    # Select random partially blocked cells 
+# seed: Seed for the random generator, default None for a random map
+def initTerrain(rows = 120, cols = 160, seed = None):
+    global c_hardregions
+    ret, c_hardregions = generateTerrain(rows, cols, random.Random(seed))
+
+    return ret
+
+# Generate a terrain as described for initTerrain, working on the code
+# array directly rather than cell by cell
+# rng: random.Random to draw from
+# Returns (terrain, hardregions); hard region centers are in inner
+# coordinates, as in .gw files
+def generateTerrain(rows = 120, cols = 160, rng = random):
+    width = cols + 2
+    codes = bytearray(b'0' * ((rows + 2) * width))
+    highway = (ord('a'), ord('b'))
+    mark = bytes.maketrans(b'12', b'ab')
+    unmark = bytes.maketrans(b'ab', b'12')
+
+    # Index of inner cell (x, y)
+    def at(x, y):
+        return (y + 1) * width + x + 1
+
+    for y in range(rows):
+        codes[at(0, y):at(cols, y)] = b'1' * cols
+
+    # Select random partially hard regions, up to 31x31 cells around
+    # a center; each cell is hard with probability 1/2, drawn a row at a time
+    hardregions = ()
+    to_hard = bytes.maketrans(b'01', b'12')
     for _ in range(8):
-        global c_hardregions
-
-        x = random.randrange(cols - 1)    
-        y = random.randrange(rows - 1)
-  
-        c_hardregions += ((x, y),)
-  
-        t_slice = [t[y][x - 15:x + 15] for y in range(max(y - 15, 0), min(y + 15, rows))] 
-        
-        for row in t_slice:
-            for v in row:
-                random.choice([v.markHardToTraverse, v.markUnblocked])()
-    
+        x = rng.randrange(cols - 1)
+        y = rng.randrange(rows - 1)
+        hardregions += ((x, y),)
+
+        x0 = max(x - 15, 0)
+        x1 = min(x + 15, cols)
+        for y_r in range(max(y - 15, 0), min(y + 15, rows)):
+            bits = format(rng.getrandbits(x1 - x0), f'0{x1 - x0}b')
+            codes[at(x0, y_r):at(x1, y_r)] = bits.encode('ascii').translate(to_hard)
+
     # Create "highways"
-    # NOTE: Assume after 10 tries that highways cannot be generated given the current config
+    # NOTE: Assume after 10 failed tries in a row that highways cannot be
+    #       generated given the current config, and start over
     # 
-    # 1 - Pick someplace on the edge
-    # 2 - Pick a random direction
-    # 3 - Push tile to list
-    # 4 - Move in direction
-    # 5 - Check if tile is a valid tile, if not break
-    # 6 - Loop back to #3 19 more times
-    # 7 - If 20 tiles have just been pushed to list, 60% chance of choosing a new direction, 20% of each perpendicular direction
-    # 8 - Check number of tiles and stopping point. If both are valid, mark
-    #     as a success, commit all as highway, and move on to the next one 
-    highways = () 
+    # 1 - Pick someplace on the edge and a random direction
+    # 2 - Mark the tile and push it to the list, then move in direction
+    # 3 - Every 20 tiles, 60% chance of keeping the direction, 20% of
+    #     each perpendicular direction
+    # 4 - Stop on leaving the map (success if at least 100 tiles) or on
+    #     hitting a highway (failure, unmark the tiles)
+    highways = []
+    n_tries = 10
     while len(highways) < 4:
-        x = -1
-        y = -1
-        cur_highway = ()
-        cur_state = 0
-        n_tries = 10
-        dir = random.randrange(4)
-
         while True:
-            if bool(random.getrandbits(1)):
-                x = random.randrange(cols)
-                y = random.choice([0, rows - 1])
+            if rng.getrandbits(1):
+                x = rng.randrange(cols)
+                y = rng.choice((0, rows - 1))
             else:
-                x = random.choice([0, cols - 1])
-                y = random.randrange(rows)
-        
-            if not t[y][x].isHighway():
-                break
+                x = rng.choice((0, cols - 1))
+                y = rng.randrange(rows)
 
-        while True:
-            if cur_state == 0: # walk
-                t[y][x].markHighway()
-
-                cur_highway += (t[y][x],)
-                 
-                if len(cur_highway) % 20 == 0: # Change direction in 20-cell segments
-                    dir += random.choice([0, 0, 0, 1, 3])
-                    dir %= 4
-                    n_cells = 0
-
-                if dir == 0: # North
-                    y -= 1
-                elif dir == 2: # South
-                    y += 1
-                elif dir == 1: # West
-                    x -= 1
-                else: # Default to East
-                    dir = 3
-                    x += 1
-              
-                # Check if we end this highway builder
-                if not 0 <= x < cols or not 0 <= y < rows or t[y][x].isHighway():
-                    cur_state = 1
-
-            elif cur_state == 1: # Check if highway is valid
-                if (
-                    len(cur_highway) < 100
-                    or (
-                        x in range(cols)
-                        and y in range(rows)
-                        and t[y][x].isHighway()
-                    )
-                ):
-                    cur_state = 2
-                else:
-                    cur_state = 3
-
-            elif cur_state == 2: # Highway is invalid, restart
-                n_tries -= 1 
-                if n_tries == 0:
-                    for hw in highways:
-                        for v in hw:
-                            v.unmarkHighway()
-
-                    highways = ()
-                else: 
-                    for v in cur_highway:
-                        v.unmarkHighway()
-
-                cur_highway = ()
+            if codes[at(x, y)] not in highway:
                 break
 
-            elif cur_state == 3: # Success, add highway to list
-                for v in cur_highway:
-                    v.markHighway()
+        dir = rng.randrange(4)
+        cur_highway = []
 
-                highways += (cur_highway,)
+        while True:
+            i = at(x, y)
+            codes[i] = mark[codes[i]]
+            cur_highway.append(i)
+
+            if len(cur_highway) % 20 == 0: # Change direction in 20-cell segments
+                dir = (dir + rng.choice((0, 0, 0, 1, 3))) % 4
+
+            if dir == 0: # North
+                y -= 1
+            elif dir == 2: # South
+                y += 1
+            elif dir == 1: # West
+                x -= 1
+            else: # East
+                x += 1
+
+            if not (0 <= x < cols and 0 <= y < rows):
+                valid = len(cur_highway) >= 100
                 break
 
-    # Generate "walls"
-    for _ in range(int(size * 0.2)):
-        while True: 
-            v = t[random.randrange(rows)][random.randrange(cols)]
-       
-            if not v.isHighway() and not v.isBlocked():
-                v.markBlocked() 
+            if codes[at(x, y)] in highway:
+                valid = False
                 break
 
-    for i in range(rows + 2):
-        for j in range(cols + 2):
-            ret[i][j].coordinates = (i, j)
-
-    return ret 
+        if valid:
+            highways.append(cur_highway)
+            n_tries = 10
+            continue
+
+        for i in cur_highway:
+            codes[i] = unmark[codes[i]]
+
+        n_tries -= 1
+        if n_tries == 0:
+            for hw in highways:
+                for i in hw:
+                    codes[i] = unmark[codes[i]]
+
+            highways = []
+            n_tries = 10
+
+    # Generate "walls" by sampling 20% of the cells, without replacement,
+    # from the cells that are neither blocked nor highway
+    flags = bytes(codes).translate(FLAGS)
+    eligible = [i for i, f in enumerate(flags) if not f & (BLOCKED | HIGHWAY)]
+    for i in rng.sample(eligible, min(int(rows * cols * 0.2), len(eligible))):
+        codes[i] = ord('0')
+
+    return Terrain(rows + 2, cols + 2, codes), hardregions
+
+#-------------Gridworld files--------------
+# NOTE: Two formats are supported:
+#       - .gw: Text. Start and goal as "x y" lines, the hard region
+#         centers as "x y" lines, then one line of cell codes per row,
+#         then optionally more start/goal pairs as "x y x y" lines
+#       - .gwb: Binary. A GWB_HEADER, the hard region centers as int32
+#         pairs, then the raw rows * cols cell codes, then optionally a
+#         uint32 count of more start/goal pairs and their int32 values.
+#         The codes are memory-mapped copy-on-write rather than read
+#         into memory.
+#       Readers detect the format from the file contents, writers from
+#       the file extension. Both return (terrain, start, goal,
+#       hardregions, pairs) where pairs lists every (start, goal) pair
+#       of the file, the one from the header first.
+
+GWB_MAGIC = b'GWB1'
+GWB_HEADER = struct.Struct('<4sIIiiiiI')  # magic, rows, cols, start, goal, number of hard regions
+
+CODES = b'012ab'
 
 def writeGridworld(path):
-    global terrain, start, goal, c_hardregions
-    with open(path, 'w') as f:
-        f.write(f"{start[0]} {start[1]}" + os.linesep)
-        f.write(f"{goal[0]} {goal[1]}" + os.linesep)
+    saveGridworld(path, terrain, start, goal, c_hardregions, pairs)
+
+# Write a gridworld without touching the module state
+# pairs: Every (start, goal) pair as returned by readGridworld; pairs[0]
+#        is (start, goal) and the others are written after the terrain
+def saveGridworld(path, terrain, start, goal, hardregions = (), pairs = ()):
+    if path.endswith('.gwb'):
+        return saveBinaryGridworld(path, terrain, start, goal, hardregions, pairs)
+
+    cols = terrain.cols
+    codes = bytes(terrain.codes)
+    header = [start, goal, *hardregions]
+
+    with open(path, 'wb') as f:
+        f.write(''.join(f"{p[0]} {p[1]}\n" for p in header).encode('ascii'))
+        f.write(b'\n'.join(codes[y * cols:(y + 1) * cols] for y in range(terrain.rows)) + b'\n')
+        f.write(''.join(f"{s[0]} {s[1]} {g[0]} {g[1]}\n" for s, g in pairs[1:]).encode('ascii'))
+
+def saveBinaryGridworld(path, terrain, start, goal, hardregions = (), pairs = ()):
+    with open(path, 'wb') as f:
+        f.write(GWB_HEADER.pack(GWB_MAGIC, terrain.rows, terrain.cols, *start, *goal, len(hardregions)))
+        f.write(struct.pack(f'<{2 * len(hardregions)}i', *(c for r in hardregions for c in r)))
+        f.write(terrain.codes)
+
+        if len(pairs) > 1:
+            f.write(struct.pack(f'<I{4 * (len(pairs) - 1)}i', len(pairs) - 1, *(c for s, g in pairs[1:] for c in (*s, *g))))
+
+# Read a .gw or .gwb file without touching the module state
+# Returns (terrain, start, goal, hardregions, pairs)
+def readGridworld(path):
+    with open(path, 'rb') as f:
+        if f.read(len(GWB_MAGIC)) == GWB_MAGIC:
+            return readBinaryGridworld(path)
+
+        f.seek(0)
+        return parseGridworld(f.read())
+
+# Parse the contents of a .gw file
+def parseGridworld(data):
+    lines = data.split(b'\n', 2)
+    start = tuple(int(x) for x in lines[0].split())
+    goal = tuple(int(x) for x in lines[1].split())
+    data = lines[2]
+
+    # Hard region centers run until the first terrain row. Files saved after
+    # several File > New carry more than 8 of them.
+    hardregions = ()
+    n = 0
+    while True:
+        end = data.find(b'\n', n)
+        line = data[n:end if end >= 0 else len(data)]
 
-        for r in c_hardregions:
-            f.write(f"{r[0]} {r[1]}" + os.linesep)
-        
-        for row in terrain:
-            f.write(''.join([repr(v) for v in row]) + os.linesep)     
+        if b' ' not in line:
+            break
 
-def loadGridworld(path):
-    global terrain, start, goal, c_hardregions
-    with open(path) as f:
-        start = tuple(int(x) for x in f.readline().split(' '))
-        goal = tuple(int(x) for x in f.readline().split(' '))
+        hardregions += (tuple(int(x) for x in line.split()),)
+        n = end + 1
 
-        c_hardregions = ()
-        for _ in range(8):
-            c_hardregions += (tuple(int(x) for x in f.readline().split(' ')),)
+    # The terrain runs until the first start/goal line, if any
+    end = data.find(b' ', n)
+    end = len(data) if end < 0 else data.rfind(b'\n', n, end) + 1
+    pairs = [(start, goal)]
 
-        terrain = []
-        for line in f:
-            print(line)
-            terrain += [[Vertex(x) for x in line], ]
+    for line in data[end:].split(b'\n'):
+        if line.strip():
+            sx, sy, gx, gy = (int(x) for x in line.split())
+            pairs.append(((sx, sy), (gx, gy)))
 
-        print(terrain)
+    # The rest is the grid: drop the line breaks in one pass and check
+    # that what is left is whole rows of valid codes
+    grid = data[n:end].rstrip()
+    cols = len(grid.split(b'\n', 1)[0].rstrip(b'\r'))
+    codes = bytearray(grid.translate(None, b'\r\n'))
+    rows = len(codes) // cols if cols else 0
+
+    if rows * cols != len(codes) or grid.count(b'\n') != rows - 1:
+        raise ValueError("Terrain rows must all be the same length")
+
+    invalid = codes.translate(None, CODES)
+    if invalid:
+        raise ValueError(f"Invalid terrain codes {bytes(sorted(set(invalid)))}")
+
+    return Terrain(rows, cols, codes), start, goal, hardregions, pairs
+
+def readBinaryGridworld(path):
+    with open(path, 'rb') as f:
+        m = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_COPY)
+
+    magic, rows, cols, sx, sy, gx, gy, n = GWB_HEADER.unpack_from(m)
+    regions = struct.unpack_from(f'<{2 * n}i', m, GWB_HEADER.size)
+    offset = GWB_HEADER.size + 8 * n
+    end = offset + rows * cols
+
+    if len(m) < end:
+        raise ValueError(f"{path} is truncated")
+
+    codes = memoryview(m)[offset:end]
+    hardregions = tuple(zip(regions[0::2], regions[1::2]))
+    pairs = [((sx, sy), (gx, gy))]
+
+    if len(m) > end:
+        n, = struct.unpack_from('<I', m, end)
+        values = struct.unpack_from(f'<{4 * n}i', m, end + 4)
+        pairs += [((values[i], values[i + 1]), (values[i + 2], values[i + 3])) for i in range(0, 4 * n, 4)]
+
+    return Terrain(rows, cols, codes), (sx, sy), (gx, gy), hardregions, pairs
+
+def loadGridworld(path):
+    global terrain, start, goal, c_hardregions, pairs
+    terrain, start, goal, c_hardregions, pairs = readGridworld(path)
+
+# Pick a start and a goal at least 100 cells apart on unblocked cells
+# rng: random.Random to draw from
+def pickEndpoints(terrain, rng = random):
+    rows = terrain.rows - 2
+    cols = terrain.cols - 2
+    flags = terrain.flags
+
+    if (rows - 1) ** 2 + (cols - 1) ** 2 < 10000:
+        raise ValueError(f"A {rows}x{cols} terrain is too small for a start and goal 100 cells apart")
 
-def initGridworld(rows = 120, cols = 160):
-    global terrain, start, goal 
-    terrain = initTerrain(rows, cols)
-    
     while True:
-        start = [random.randrange(cols) + 1, random.randrange(rows) + 1]
-        goal = [random.randrange(cols) + 1, random.randrange(rows) + 1]
+        start = [rng.randrange(cols) + 1, rng.randrange(rows) + 1]
+        goal = [rng.randrange(cols) + 1, rng.randrange(rows) + 1]
         
         if (
             sum([(a - b) ** 2 for a, b in zip(start, goal)]) >= 10000 
-            and not terrain[start[1]][start[0]].isBlocked() 
-            and not terrain[goal[1]][goal[0]].isBlocked()
+            and not flags[terrain.index(*start)] & BLOCKED
+            and not flags[terrain.index(*goal)] & BLOCKED
         ):
-            break
+            return start, goal
+
+# Generate a terrain with start/goal pairs without touching the module state
+# seed: Seed for the random generator, default None for a random map
+# n_pairs: Number of start/goal pairs to pick
+# Returns (terrain, start, goal, hardregions, pairs) as readGridworld
+def generateGridworld(rows = 120, cols = 160, seed = None, n_pairs = 1):
+    rng = random.Random(seed)
+    terrain, hardregions = generateTerrain(rows, cols, rng)
+    pairs = [tuple(tuple(p) for p in pickEndpoints(terrain, rng)) for _ in range(n_pairs)]
+
+    return terrain, pairs[0][0], pairs[0][1], hardregions, pairs
+
+# Generate n gridworlds in one call, reproducibly from one seed
+# Returns a list of (terrain, start, goal, hardregions, pairs)
+def generateGridworlds(n, rows = 120, cols = 160, seed = None, n_pairs = 1):
+    rng = random.Random(seed)
+    return [generateGridworld(rows, cols, rng.getrandbits(64), n_pairs) for _ in range(n)]
+
+def initGridworld(rows = 120, cols = 160, seed = None):
+    global terrain, start, goal, c_hardregions, pairs
+    terrain, start, goal, c_hardregions, pairs = generateGridworld(rows, cols, seed)
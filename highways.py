@@ -0,0 +1,289 @@
+from math import inf
+import costmodel
+import gridworld
+from costmodel import DIRECTIONS
+
+#-------------Highway overlay--------------
+# NOTE: Highways are long chains of cells where a straight step costs a
+#       quarter, so long optimal paths mostly ride them, one cheap
+#       expansion per cell. The overlay cuts each chain (split where
+#       highways touch) at waypoints every SPACING cells into segments,
+#       and contracts the cells inside a segment: the search no longer
+#       steps from highway cell to highway cell, but takes edges costed
+#       along the chain instead:
+#       - from every chain cell to the waypoints on either side of it
+#       - from every waypoint to the next waypoints and to both ends
+#       - from every cell of a segment (its waypoints included) to the
+#         cells next to the inner cells of the segment, off the chain;
+#         the path rides to that inner cell and leaves the highway there
+#       - to the goal, if it is inside the segment
+#       Inner cells are then only expanded when a path enters the
+#       highway there, not on every ride past them. Any ride along a
+#       chain is still covered by these edges at its own cost, so costs
+#       stay optimal. The overlay is rebuilt when a highway cell or one
+#       next to it changes (markHighway, unmarkHighway, or any edit).
+
+SPACING = 8
+
+# Straight directions; a diagonal step never gets the highway discount
+STRAIGHT = tuple(d for d, (dx, dy) in enumerate(DIRECTIONS) if not (dx and dy))
+
+# HighwayOverlay holds the highway chains of a terrain and the edges that
+# replace the steps between their cells
+# - chains[k]: Cells of chain k in order, and costs[k][p] the cost along
+#   it from chains[k][0] to chains[k][p]
+# - shortcuts[i]: (offset, cost) of each edge of highway cell i: its
+#   ordinary edges off the highway, and the edges listed in the NOTE
+# - routes[(i, j)]: (k, p, q, leave) for the edge from chains[k][p] = i
+#   riding to chains[k][q], which is j unless leave is true, in which
+#   case the edge then steps off the highway to j
+# - segments[i]: (k, p, lo, hi) for each inner cell i = chains[k][p] of a
+#   segment running from waypoint lo to waypoint hi
+class HighwayOverlay:
+    def __init__(self, terrain, profile = None):
+        self.terrain = terrain
+        self.profile = profile or costmodel.STANDARD
+        self.edges = costmodel.edgeCosts(terrain, self.profile)
+        self.chains = []
+        self.costs = []
+        self.shortcuts = {}
+        self.routes = {}
+        self.segments = {}
+        self.dirty = True
+
+        terrain.watch(self.update)
+
+    def close(self):
+        self.terrain.unwatch(self.update)
+
+    # Mark the overlay for rebuilding if cell i or a cell next to it is or
+    # was a highway cell
+    def update(self, i):
+        if self.dirty:
+            return
+
+        if self.terrain.flags[i] & gridworld.HIGHWAY or any(i + o in self.shortcuts for o in self.edges.offsets + (0,)):
+            self.dirty = True
+
+    # Rebuild the overlay if a highway changed since it was built
+    # Returns shortcuts
+    def refresh(self):
+        if self.dirty:
+            self.build()
+
+        return self.shortcuts
+
+    def build(self):
+        flags = self.terrain.flags
+        offsets = self.edges.offsets
+        costs = self.edges.costs
+
+        # Straight highway-to-highway steps of each highway cell
+        links = {}
+        for i, f in enumerate(flags):
+            if f & gridworld.HIGHWAY:
+                links[i] = [
+                    (i + offsets[d], costs[d][i]) for d in STRAIGHT
+                    if costs[d][i] < inf and flags[i + offsets[d]] & gridworld.HIGHWAY
+                ]
+
+        self.chains = []
+        self.costs = []
+        seen = set()
+
+        # Chains run between cells that do not have exactly two highway
+        # neighbours; what is left after that are closed loops
+        for loops in (False, True):
+            for i, out in links.items():
+                if len(out) == 2 and not loops:
+                    continue
+
+                for j, c in out:
+                    if (i, j) not in seen:
+                        self.__walk(links, seen, i, j, c)
+
+        # Each highway cell keeps its ordinary edges, except the steps to
+        # the highway cells it is linked to
+        best = {}
+        for i, out in links.items():
+            linked = {j for j, _ in out}
+            best[i] = {i + o: (c[i], None) for o, c in zip(offsets, costs) if c[i] < inf and i + o not in linked}
+
+        self.routes = {}
+        self.segments = {}
+        for k in range(len(self.chains)):
+            self.__link(best, k)
+
+        self.shortcuts = {i: [(j - i, c) for j, (c, _) in edges.items()] for i, edges in best.items()}
+        for i, edges in best.items():
+            for j, (_, route) in edges.items():
+                if route is not None:
+                    self.routes[(i, j)] = route
+
+        self.dirty = False
+
+    # Follow a chain from cell a through its neighbour b
+    def __walk(self, links, seen, a, b, c):
+        chain = [a]
+        cost = [0]
+        prev = a
+
+        while True:
+            seen.add((prev, b))
+            seen.add((b, prev))
+            chain.append(b)
+            cost.append(cost[-1] + c)
+
+            if len(links[b]) != 2 or b == a:
+                break
+
+            (j, c_j), = [(j, c_j) for j, c_j in links[b] if j != prev]
+            prev, b, c = b, j, c_j
+
+        self.chains.append(chain)
+        self.costs.append(cost)
+
+    # Add the edges of chain k
+    # best: Cheapest (cost, route) to each cell j from each highway cell i,
+    #       as best[i][j], with None as the route of an ordinary edge
+    def __link(self, best, k):
+        chain = self.chains[k]
+        n = len(chain)
+        waypoints = list(range(0, n - 1, SPACING)) + [n - 1]
+
+        for w, p in enumerate(waypoints):
+            # Waypoints reach the waypoints next to them and both ends
+            for q in {waypoints[max(w - 1, 0)], waypoints[min(w + 1, len(waypoints) - 1)], 0, n - 1}:
+                self.__add(best, k, p, q, chain[q], 0, False)
+
+            if w + 1 == len(waypoints):
+                break
+
+            hi = waypoints[w + 1]
+            exits = self.__exits(best, k, p + 1, hi)
+
+            # Inner cells reach the waypoints around them
+            for p_c in range(p + 1, hi):
+                self.segments[chain[p_c]] = (k, p_c, p, hi)
+                self.__add(best, k, p_c, p, chain[p], 0, False)
+                self.__add(best, k, p_c, hi, chain[hi], 0, False)
+
+            # Every cell of the segment leaves the highway at any inner cell
+            for p_c in range(p, hi + 1):
+                for q, j, c in exits:
+                    if q != p_c:
+                        self.__add(best, k, p_c, q, j, c, True)
+
+    # Edges off the highway of the inner cells from position lo to hi (not
+    # included) of chain k, as (position, cell, cost)
+    def __exits(self, best, k, lo, hi):
+        chain = self.chains[k]
+        ret = []
+
+        for q in range(lo, hi):
+            for j, (c, route) in best[chain[q]].items():
+                if route is None:
+                    ret.append((q, j, c))
+
+        return ret
+
+    # Edge from position p of chain k riding to position q, then stepping
+    # off the highway to j at cost c if leave is true; kept if it is the
+    # cheapest edge between its cells
+    def __add(self, best, k, p, q, j, c, leave):
+        i = self.chains[k][p]
+        if i == j:  # Both ends of a loop
+            return
+
+        cost = abs(self.costs[k][q] - self.costs[k][p]) + c
+        edges = best[i]
+
+        if j not in edges or cost < edges[j][0]:
+            edges[j] = (cost, (k, p, q, leave))
+
+    # Edges of highway cell i as (offset, cost), with one to the goal cell
+    # if it is inside a segment i belongs to
+    def successors(self, i, goal):
+        ret = self.shortcuts[i]
+        segment = self.segments.get(goal)
+
+        if segment is None or i == goal:
+            return ret
+
+        k, q, lo, hi = segment
+        p = self.__position(i, k, lo, hi)
+        if p is None:
+            return ret
+
+        return ret + [(goal - i, abs(self.costs[k][q] - self.costs[k][p]))]
+
+    # Position of cell i in the segment of chain k from waypoint lo to hi,
+    # or None if it is not in it
+    def __position(self, i, k, lo, hi):
+        chain = self.chains[k]
+
+        if i == chain[lo]:
+            return lo
+        elif i == chain[hi]:
+            return hi
+        elif i in self.segments and self.segments[i][::2] == (k, lo):
+            return self.segments[i][1]
+
+        return None
+
+    # Route of the cheapest edge from cell i to cell j, see routes; edges
+    # to a goal inside a segment are not stored, but can be cheaper
+    def route(self, i, j):
+        ret = self.routes.get((i, j))
+
+        if j in self.segments and i in self.shortcuts:
+            k, q, lo, hi = self.segments[j]
+            p = self.__position(i, k, lo, hi)
+
+            if p is not None and (ret is None or self.__cost(k, p, q, False, j) < self.__cost(*ret, j)):
+                ret = (k, p, q, False)
+
+        return ret
+
+    # Cost of route (k, p, q, leave) to cell j
+    def __cost(self, k, p, q, leave, j):
+        ret = abs(self.costs[k][q] - self.costs[k][p])
+
+        if leave:
+            i = self.chains[k][q]
+            ret += self.edges.costs[self.edges.offsets.index(j - i)][i]
+
+        return ret
+
+    # Fill in the highway cells skipped by the edges of a path
+    # path: List of (x, y)
+    def fillPath(self, path):
+        if not path:
+            return path
+
+        cols = self.terrain.cols
+        ret = [path[0]]
+
+        for x, y in path[1:]:
+            route = self.route(ret[-1][1] * cols + ret[-1][0], y * cols + x)
+
+            if route is not None:
+                k, p, q, leave = route
+                step = 1 if q > p else -1
+                end = q + step if leave else q
+                ret += [(j % cols, j // cols) for j in self.chains[k][p + step:end if end >= 0 else None:step]]
+
+            ret.append((x, y))
+
+        return ret
+
+# Highway overlay of a terrain, built on first use and kept on the terrain
+# for each profile
+def highwayOverlay(terrain, profile = None):
+    profile = profile or costmodel.STANDARD
+    overlays = terrain.highwayOverlays
+
+    if profile not in overlays:
+        overlays[profile] = HighwayOverlay(terrain, profile)
+
+    return overlays[profile]
@@ -0,0 +1,351 @@
+import heapq
+from math import inf
+from time import perf_counter
+import a_star
+import costmodel
+from costmodel import DIRECTIONS, DIRECTION_INDEX
+
+#-------------Hierarchical search (HPA*)--------------
+# NOTE: The terrain is cut into size x size clusters. Where two clusters
+#       touch, each run of open crossings of the same cost gets one or two
+#       transitions (pairs of adjacent cells), and within a cluster the
+#       transitions are linked by their cheapest path inside it. A query searches this
+#       small abstract graph and only then finds the cell-level path of
+#       each chosen segment.
+#       Clusters and borders are built when a search first reaches them
+#       and dropped when one of their cells changes, so even very large
+#       maps only pay for the part that queries actually use. Paths are
+#       usually within a few percent of optimal.
+
+DEFAULT_SIZE = 16
+
+# Runs of open crossings of the same cost at least this long get a
+# transition at both ends
+LONG_RUN = 6
+
+class Hierarchy:
+    # terrain: Gridworld terrain map
+    # size: Width and height of a cluster in cells
+    # profile: Edge cost profile, default costmodel.STANDARD
+    def __init__(self, terrain, size = DEFAULT_SIZE, profile = None):
+        self.terrain = terrain
+        self.size = size
+        self.profile = profile or costmodel.STANDARD
+        self.edges = costmodel.edgeCosts(terrain, self.profile)
+        self.ncx = -(-terrain.cols // size)
+        self.ncy = -(-terrain.rows // size)
+
+        # Transitions (a, b, cost) between clusters c1 < c2, by (c1, c2)
+        self.borders = {}
+
+        # Abstract edges of the transitions of a cluster, by cluster:
+        # {u: [(v, cost), ...]}
+        self.links = {}
+
+        # Cheapest cost of an edge per unit of Chebyshev distance, which
+        # makes a lower bound for the abstract search
+        self.unit = min(self.profile.cost(a, b, d) for a in range(8) for b in range(8) for d in (False, True))
+
+        terrain.watch(self.update)
+
+    def close(self):
+        self.terrain.unwatch(self.update)
+
+    def clusterOf(self, i):
+        cols = self.terrain.cols
+        return (i // cols // self.size) * self.ncx + i % cols // self.size
+
+    # Cell bounds (x0, y0, x1, y1) of cluster c, exclusive of x1 and y1
+    def bounds(self, c):
+        size = self.size
+        cx = c % self.ncx
+        cy = c // self.ncx
+        return cx * size, cy * size, min((cx + 1) * size, self.terrain.cols), min((cy + 1) * size, self.terrain.rows)
+
+    # Clusters touching cluster c, including diagonally
+    def neighbours(self, c):
+        cx = c % self.ncx
+        cy = c // self.ncx
+
+        return [
+            (cy + dy) * self.ncx + cx + dx for dx, dy in DIRECTIONS
+            if 0 <= cx + dx < self.ncx and 0 <= cy + dy < self.ncy
+        ]
+
+    # Transitions between clusters c1 and c2, built on first use
+    def border(self, c1, c2):
+        if c1 > c2:
+            c1, c2 = c2, c1
+
+        key = (c1, c2)
+        if key not in self.borders:
+            self.borders[key] = self.__buildBorder(c1, c2)
+
+        return self.borders[key]
+
+    def __buildBorder(self, c1, c2):
+        cols = self.terrain.cols
+        costs = self.edges.costs
+        x0, y0, x1, y1 = self.bounds(c1)
+        dx = c2 % self.ncx - c1 % self.ncx
+        dy = c2 // self.ncx - c1 // self.ncx
+
+        # Clusters touching at a corner share a single diagonal crossing
+        if dx and dy:
+            a = (y1 - 1) * cols + (x1 - 1 if dx > 0 else x0)
+            c = costs[DIRECTION_INDEX[(dx, dy)]][a]
+            return [(a, a + dy * cols + dx, c)] if c < inf else []
+
+        # Otherwise walk along the border: a is the cell of c1, a + across
+        # the cell of c2 next to it
+        if dx:
+            first = y0 * cols + x1 - 1
+            along = (0, 1)
+            length = y1 - y0
+        else:
+            first = (y1 - 1) * cols + x0
+            along = (1, 0)
+            length = x1 - x0
+
+        step = along[1] * cols + along[0]
+        across = dy * cols + dx
+        straight = costs[DIRECTION_INDEX[(dx, dy)]]
+        forward = costs[DIRECTION_INDEX[(dx + along[0], dy + along[1])]]
+        backward = costs[DIRECTION_INDEX[(dx - along[0], dy - along[1])]]
+
+        open = [straight[first + k * step] < inf for k in range(length)]
+        ret = []
+
+        k = 0
+        while k < length:
+            if not open[k]:
+                # Diagonal crossings only matter where no straight one is
+                # open on either side
+                a = first + k * step
+                if k + 1 < length and not open[k + 1] and forward[a] < inf:
+                    ret.append((a, a + across + step, forward[a]))
+                if k > 0 and not open[k - 1] and backward[a] < inf:
+                    ret.append((a, a + across - step, backward[a]))
+
+                k += 1
+                continue
+
+            # A run also ends where the crossing cost changes, so highways
+            # and hard cells get transitions of their own
+            end = k
+            while end + 1 < length and open[end + 1] and straight[first + (end + 1) * step] == straight[first + k * step]:
+                end += 1
+
+            picks = (k, end) if end - k + 1 >= LONG_RUN else ((k + end) // 2,)
+            for p in picks:
+                a = first + p * step
+                ret.append((a, a + across, straight[a]))
+
+            k = end + 1
+
+        return ret
+
+    # Cheapest paths from source to the cells of cluster c, staying inside it
+    # targets: Cells to stop at once they are all reached, default every cell
+    # Returns (dist, parent) dicts; dist is inf for unreached cells
+    def local(self, c, source, targets = None):
+        cols = self.terrain.cols
+        x0, y0, x1, y1 = self.bounds(c)
+        neighbours = tuple(zip(self.edges.offsets, self.edges.costs))
+
+        # Only cells of the cluster have a distance, so one lookup both
+        # bounds the search and reads the distance
+        dist = dict.fromkeys((i for y in range(y0, y1) for i in range(y * cols + x0, y * cols + x1)), inf)
+        dist[source] = 0
+        parent = {source: -1}
+        heap = [(0, source)]
+        left = len(targets) if targets is not None else -1
+
+        while heap and left:
+            d, n = heapq.heappop(heap)
+
+            if d > dist[n]:
+                continue
+
+            if targets is not None and n in targets:
+                left -= 1
+
+            for o, e in neighbours:
+                e = e[n]
+                if e == inf:
+                    continue
+
+                m = n + o
+                d_m = d + e
+                if d_m < dist.get(m, -1):
+                    dist[m] = d_m
+                    parent[m] = n
+                    heapq.heappush(heap, (d_m, m))
+
+        return dist, parent
+
+    # Abstract edges of cluster c, built on first use
+    def clusterLinks(self, c):
+        ret = self.links.get(c)
+        if ret is not None:
+            return ret
+
+        ret = {}
+        inter = []
+        for c2 in self.neighbours(c):
+            for a, b, cost in self.border(c, c2):
+                if self.clusterOf(a) != c:
+                    a, b = b, a
+                inter.append((a, b, cost))
+                ret.setdefault(a, [])
+
+        # Costs are symmetric, so each pair of transitions is searched once
+        nodes = list(ret)
+        for k, u in enumerate(nodes):
+            targets = set(nodes[k + 1:])
+            dist, _ = self.local(c, u, targets)
+
+            for v in targets:
+                if dist[v] < inf:
+                    ret[u].append((v, dist[v]))
+                    ret[v].append((u, dist[v]))
+
+        for a, b, cost in inter:
+            ret[a].append((b, cost))
+
+        self.links[c] = ret
+        return ret
+
+    # Build every cluster up front rather than on first use
+    def build(self):
+        for c in range(self.ncx * self.ncy):
+            self.clusterLinks(c)
+
+    # Drop everything that depends on cell i
+    def update(self, i):
+        cols = self.terrain.cols
+        c = self.clusterOf(i)
+        self.links.pop(c, None)
+
+        x = i % cols
+        y = i // cols
+        for dx, dy in DIRECTIONS:
+            if 0 <= x + dx < cols and 0 <= y + dy < self.terrain.rows:
+                c2 = self.clusterOf(i + dy * cols + dx)
+
+                if c2 != c:
+                    self.borders.pop((min(c, c2), max(c, c2)), None)
+                    self.links.pop(c2, None)
+
+    # Cells from the root of a local search to i
+    def __trace(self, parent, i):
+        ret = []
+        while i != -1:
+            ret.append(i)
+            i = parent[i]
+
+        ret.reverse()
+        return ret
+
+    # Search from start to goal
+    # Returns a dict with the path ('map'), its 'cost', the number of
+    # abstract 'expansions' and the SearchStats ('stats'), or None if no
+    # path was found through the abstract graph
+    def search(self, start, goal):
+        t = perf_counter()
+        cols = self.terrain.cols
+        s = start[1] * cols + start[0]
+        g = goal[1] * cols + goal[0]
+        c_s = self.clusterOf(s)
+        c_g = self.clusterOf(g)
+        unit = self.unit
+        stats = a_star.SearchStats(1)
+
+        # Costs are symmetric, so a local search from the goal gives the
+        # cost from each cell of its cluster to the goal
+        d_s, p_s = self.local(c_s, s)
+        d_g, p_g = self.local(c_g, g)
+
+        best = d_s[g] if c_s == c_g else inf
+        best_u = None
+
+        cost = {}
+        parent = {}
+        heap = []
+        for u in self.clusterLinks(c_s):
+            if d_s[u] < inf:
+                cost[u] = d_s[u]
+                parent[u] = -1
+                heapq.heappush(heap, (d_s[u] + unit * max(abs(u % cols - goal[0]), abs(u // cols - goal[1])), u))
+
+        while heap:
+            f, u = heapq.heappop(heap)
+
+            if f >= best:
+                break
+
+            g_u = cost[u]
+            if f > g_u + unit * max(abs(u % cols - goal[0]), abs(u // cols - goal[1])):
+                continue
+
+            stats.expansions[0] += 1
+            c = self.clusterOf(u)
+
+            if c == c_g and g_u + d_g[u] < best:
+                best = g_u + d_g[u]
+                best_u = u
+
+            for v, w in self.clusterLinks(c)[u]:
+                g_v = g_u + w
+                if g_v < cost.get(v, inf):
+                    cost[v] = g_v
+                    parent[v] = u
+                    heapq.heappush(heap, (g_v + unit * max(abs(v % cols - goal[0]), abs(v // cols - goal[1])), v))
+
+        if best == inf:
+            return None
+
+        # Refine the chosen segments into cells
+        if best_u is None:
+            path = self.__trace(p_s, g)
+        else:
+            chain = []
+            u = best_u
+            while u != -1:
+                chain.append(u)
+                u = parent[u]
+            chain.reverse()
+
+            path = self.__trace(p_s, chain[0])
+            for u, v in zip(chain, chain[1:]):
+                c = self.clusterOf(u)
+                if c == self.clusterOf(v):
+                    path += self.__trace(self.local(c, u, {v})[1], v)[1:]
+                else:
+                    path.append(v)
+
+            # p_g leads from each cell of the goal cluster back to the goal
+            u = p_g[best_u]
+            while u != -1:
+                path.append(u)
+                u = p_g[u]
+
+        stats.search_time = perf_counter() - t
+
+        return {
+            'map': [(i % cols, i // cols) for i in path],
+            'cost': best,
+            'stats': stats,
+            'expansions': stats.totalExpansions()
+        }
+
+# Hierarchy of a terrain, kept on the terrain for each cluster size and
+# profile
+def hierarchy(terrain, size = DEFAULT_SIZE, profile = None):
+    profile = profile or costmodel.STANDARD
+    hierarchies = terrain.hierarchies
+
+    if (size, profile) not in hierarchies:
+        hierarchies[(size, profile)] = Hierarchy(terrain, size, profile)
+
+    return hierarchies[(size, profile)]
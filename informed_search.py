@@ -0,0 +1,257 @@
+import argparse
+import atexit
+import csv
+import json
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import gridworld
+import landmarks
+import parallel
+import resultcache
+from searcher import GridSearcher, parseConfig
+
+#-------------Headless query engine--------------
+# NOTE: Runs the A* variants over .gw files without the Qt app and
+#       without the gridworld module globals, e.g.
+#
+#       python -m informed_search run test1.gw test2.gw \
+#           -c uniform -c weighted,h=manhattan,w=1.5 -c sequential,w=1.25,w2=2
+#
+#       Each query is written as one JSON line (or CSV row) on stdout.
+#       With --jobs N, queries are spread over N worker processes; every
+#       map is placed once in shared memory and attached by the workers.
+#       Landmark tables saved next to a map (see the landmarks command)
+#       are used by h=landmarks instead of being selected again.
+#       With --cache FILE, results are kept in a SQLite file (see
+#       resultcache.py) and repeated queries are read back from it.
+
+FIELDS = (
+    'map', 'algorithm', 'heuristic', 'w', 'w2', 'expand', 'bidirectional', 'open', 'start', 'goal',
+    'found', 'cached', 'cost', 'bound', 'length', 'expansions', 'time', 'peak_kb'
+)
+
+# Run one configuration from start to goal
+# Returns the search result of a_star, or None if no path was found
+def search(terrain, start, goal, config, **kwargs):
+    return GridSearcher(terrain).query(start, goal, config, **kwargs)
+
+# Run and measure one query
+# Returns a dict with one value for each of FIELDS, plus the search 'stats'
+# terrain: Gridworld terrain map, or a GridSearcher bound to one
+# cache: ResultCache to read the result from (and store it in), if any
+def runQuery(name, terrain, start, goal, config, trace_memory = True, cache = None):
+    if trace_memory:
+        tracemalloc.start()
+
+    try:
+        t = time.perf_counter()
+        map = terrain.terrain if isinstance(terrain, GridSearcher) else terrain
+        info = cache.get(map, start, goal, config) if cache is not None else None
+        cached = info is not None
+
+        if info is None:
+            if isinstance(terrain, GridSearcher):
+                info = terrain.query(start, goal, config)
+            else:
+                info = search(terrain, start, goal, config)
+
+            if cache is not None:
+                cache.put(map, start, goal, config, info)
+        t = time.perf_counter() - t
+
+        peak = tracemalloc.get_traced_memory()[1] // 1024 if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    return {
+        'map': name,
+        'algorithm': config['algorithm'],
+        'heuristic': config['h'] if config['algorithm'] in ('weighted', 'anytime') else config.get('anchor'),
+        'w': config['w'],
+        'w2': config['w2'],
+        'expand': config.get('expand', 'full'),
+        'bidirectional': config.get('bidirectional', False),
+        'open': config.get('open', 'heap'),
+        'start': list(start),
+        'goal': list(goal),
+        'found': info is not None,
+        'cached': cached,
+        'cost': info['cost'] if info else None,
+        'bound': info.get('bound') if info else None,
+        'length': len(info['map']) if info else None,
+        'expansions': info['expansions'] if info else None,
+        'time': t,
+        'peak_kb': peak,
+        'stats': info['stats'].asDict() if info else None
+    }
+
+# Run every configuration on every start/goal pair of every map
+# cache: Result cache file, if any
+# Yields one result dict per query
+def runFiles(paths, configs, trace_memory = True, cache = None):
+    cache = resultcache.ResultCache(cache) if cache else None
+
+    try:
+        for path in paths:
+            terrain, _, _, _, pairs = gridworld.readGridworld(path)
+            landmarks.attachLandmarks(terrain, path)
+            searcher = GridSearcher(terrain)
+
+            try:
+                for start, goal in pairs:
+                    for config in configs:
+                        yield runQuery(path, searcher, start, goal, config, trace_memory, cache)
+            finally:
+                # The map is done with, so stop its 'parallel' workers now
+                # rather than whenever it is collected
+                parallel.closeSearchers(terrain)
+    finally:
+        if cache is not None:
+            cache.close()
+
+# Searcher over each map attached by a worker process, by shared memory name
+_attached = {}
+
+# Result cache opened by a worker process, by file
+_caches = {}
+
+def _attach(shm_name, rows, cols, path):
+    if shm_name not in _attached:
+        # Pool workers share the parent's resource tracker, so attaching
+        # does not hand ownership of the block to the worker
+        shm = shared_memory.SharedMemory(shm_name)
+
+        if not _attached:
+            atexit.register(_detach)
+
+        terrain = gridworld.Terrain(rows, cols, shm.buf[:rows * cols])
+        landmarks.attachLandmarks(terrain, path)
+        _attached[shm_name] = (shm, GridSearcher(terrain))
+
+    return _attached[shm_name][1]
+
+# Release the terrain views before the blocks are closed at exit
+def _detach():
+    for shm, searcher in _attached.values():
+        searcher.terrain.codes.release()
+        shm.close()
+
+    _attached.clear()
+
+def _runJob(name, shm_name, rows, cols, start, goal, config, trace_memory, cache):
+    if cache and cache not in _caches:
+        _caches[cache] = resultcache.ResultCache(cache)
+
+    return runQuery(name, _attach(shm_name, rows, cols, name), start, goal, config, trace_memory, _caches.get(cache))
+
+# Run every configuration on every start/goal pair of every map over a
+# pool of worker processes
+# cache: Result cache file, if any; the workers share it
+# Yields one result dict per query, in completion order
+def runParallel(paths, configs, jobs = None, trace_memory = True, cache = None):
+    shared = []
+    try:
+        tasks = []
+        for path in paths:
+            terrain, _, _, _, pairs = gridworld.readGridworld(path)
+            size = len(terrain.codes)
+
+            shm = shared_memory.SharedMemory(create = True, size = max(size, 1))
+            shm.buf[:size] = terrain.codes
+            shared.append(shm)
+
+            for start, goal in pairs:
+                for config in configs:
+                    tasks.append((path, shm.name, terrain.rows, terrain.cols, start, goal, config, trace_memory, cache))
+
+        with ProcessPoolExecutor(jobs) as pool:
+            futures = [pool.submit(_runJob, *t) for t in tasks]
+
+            for future in as_completed(futures):
+                yield future.result()
+    finally:
+        for shm in shared:
+            shm.close()
+            shm.unlink()
+
+# Writers for the result dicts
+def writeJSON(results, out):
+    for r in results:
+        out.write(json.dumps(r) + '\n')
+        out.flush()
+
+def writeCSV(results, out):
+    writer = csv.DictWriter(out, FIELDS, extrasaction = 'ignore')
+    writer.writeheader()
+
+    for r in results:
+        writer.writerow(dict(r, start = ' '.join(map(str, r['start'])), goal = ' '.join(map(str, r['goal']))))
+        out.flush()
+
+def buildParser():
+    ret = argparse.ArgumentParser(prog = 'informed_search', description = "Headless informed search over Gridworld files")
+    commands = ret.add_subparsers(dest = 'command', required = True)
+
+    run = commands.add_parser('run', help = "Run search configurations over .gw files")
+    run.add_argument('maps', nargs = '+', help = "Gridworld (.gw) files")
+    run.add_argument('-c', '--config', action = 'append', type = parseConfig, dest = 'configs',
+                     help = "algorithm[,h=NAME][,w=W][,w2=W2][,anchor=NAME][,expand=full|jump|highway][,bidirectional][,deadline=SECONDS][,open=heap|bucket], may be repeated (default: uniform)")
+    run.add_argument('-f', '--format', choices = ('json', 'csv'), default = 'json')
+    run.add_argument('--no-trace-memory', action = 'store_false', dest = 'trace_memory',
+                     help = "Skip tracemalloc, which slows searches down; peak_kb is reported as null")
+    run.add_argument('-j', '--jobs', type = int, default = 1,
+                     help = "Number of worker processes, 0 for one per CPU (default: 1, no pool)")
+    run.add_argument('--cache', metavar = 'FILE', help = "SQLite file to keep results in and read repeated queries from")
+
+    convert = commands.add_parser('convert', help = "Convert between .gw and binary .gwb files")
+    convert.add_argument('source', help = "Gridworld file to read (.gw or .gwb)")
+    convert.add_argument('target', help = "Gridworld file to write, binary if it ends in .gwb")
+
+    alt = commands.add_parser('landmarks', help = "Select landmarks of .gw files and save their tables next to them")
+    alt.add_argument('maps', nargs = '+', help = "Gridworld files (.gw or .gwb)")
+    alt.add_argument('-k', type = int, default = landmarks.DEFAULT_K, help = f"Number of landmarks (default: {landmarks.DEFAULT_K})")
+    alt.add_argument('--method', choices = landmarks.METHODS, default = 'farthest')
+
+    generate = commands.add_parser('generate', help = "Generate seeded .gw files with several start/goal pairs")
+    generate.add_argument('target', help = "File name pattern, e.g. map{}.gw; {} is replaced by the map number")
+    generate.add_argument('-n', '--count', type = int, default = 1, help = "Number of maps (default: 1)")
+    generate.add_argument('-p', '--pairs', type = int, default = 10, help = "Start/goal pairs per map (default: 10)")
+    generate.add_argument('--rows', type = int, default = 120)
+    generate.add_argument('--cols', type = int, default = 160)
+    generate.add_argument('--seed', type = int, default = None)
+
+    return ret
+
+def main(argv = None):
+    args = buildParser().parse_args(argv)
+
+    if args.command == 'run':
+        configs = args.configs or [parseConfig('uniform')]
+        if args.jobs == 1:
+            results = runFiles(args.maps, configs, args.trace_memory, args.cache)
+        else:
+            results = runParallel(args.maps, configs, args.jobs or None, args.trace_memory, args.cache)
+
+        (writeCSV if args.format == 'csv' else writeJSON)(results, sys.stdout)
+
+    elif args.command == 'convert':
+        gridworld.saveGridworld(args.target, *gridworld.readGridworld(args.source))
+
+    elif args.command == 'landmarks':
+        for path in args.maps:
+            terrain = gridworld.readGridworld(path)[0]
+            landmarks.saveLandmarks(landmarks.landmarkPath(path), landmarks.selectLandmarks(terrain, args.k, args.method))
+
+    elif args.command == 'generate':
+        maps = gridworld.generateGridworlds(args.count, args.rows, args.cols, args.seed, args.pairs)
+        for i, m in enumerate(maps):
+            gridworld.saveGridworld(args.target.format(i), *m)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,390 @@
+import heapq
+from array import array
+from math import inf
+import costmodel
+import gridworld
+from costmodel import DIRECTIONS, DIRECTION_INDEX
+
+#-------------Jump point expansion--------------
+# NOTE: In a region of plain ('1') cells, most of the 8 neighbours of a
+#       cell are also reached at least as cheaply through its parent, so
+#       symmetric paths are pruned and the search jumps along straight and
+#       diagonal runs, only stopping at cells with a forced neighbour.
+#       A cell is only treated this way when its whole 3x3 neighbourhood
+#       is plain or blocked; highway and hard to traverse cells (and their
+#       neighbours) are expanded normally, and jumps stop on them.
+#       Which neighbours survive pruning is not hard-coded: it is derived
+#       from the cost profile by comparing, within the 3x3 neighbourhood,
+#       the path through the cell against the best path around it.
+
+# Pruning tables by profile; they do not depend on the terrain
+_pruningTables = {}
+
+# Successor directions of a cell by the direction it was entered in and
+# the mask of its blocked neighbours (bit e set if neighbour e is blocked)
+# Returns a list of 8 lists of 256 bitmasks
+def pruningTable(profile):
+    if profile in _pruningTables:
+        return _pruningTables[profile]
+
+    straight = profile.cost(0, 0, False)
+    diagonal = profile.cost(0, 0, True)
+
+    def step(e):
+        dx, dy = DIRECTIONS[e]
+        return diagonal if dx and dy else straight
+
+    ret = []
+    for d in range(len(DIRECTIONS)):
+        row = []
+        p = 7 - d  # The parent is the neighbour opposite to d
+
+        for mask in range(256):
+            # Cheapest paths from the parent around the 3x3 neighbourhood,
+            # without going through the centre cell
+            dist = [inf] * 8
+            dist[p] = 0
+            heap = [(0, p)]
+
+            while heap:
+                c, a = heapq.heappop(heap)
+                if c > dist[a]:
+                    continue
+
+                ax, ay = DIRECTIONS[a]
+                for b, (bx, by) in enumerate(DIRECTIONS):
+                    if mask >> b & 1 or max(abs(ax - bx), abs(ay - by)) != 1:
+                        continue
+
+                    c_b = c + (diagonal if ax != bx and ay != by else straight)
+                    if c_b < dist[b]:
+                        dist[b] = c_b
+                        heapq.heappush(heap, (c_b, b))
+
+            succ = 0
+            for e in range(len(DIRECTIONS)):
+                if e == p or mask >> e & 1:
+                    continue
+
+                through = step(d) + step(e)
+
+                # Straight moves keep a neighbour only if going around is
+                # strictly worse, diagonal moves if it is not strictly better
+                if step(d) == straight:
+                    keep = dist[e] > through + 1e-9
+                else:
+                    keep = dist[e] >= through - 1e-9
+
+                if keep:
+                    succ |= 1 << e
+
+            row.append(succ)
+        ret.append(row)
+
+    _pruningTables[profile] = ret
+    return ret
+
+# Flags as 0/1 bytes: blocked cells, and cells that are not plain (highway
+# or hard to traverse) without being blocked
+_BLOCKED = bytes(1 if f & gridworld.BLOCKED else 0 for f in range(256))
+_SPECIAL = bytes(1 if f and not f & gridworld.BLOCKED else 0 for f in range(256))
+_NOT = bytes((1, 0)) + bytes(254)
+
+# Copy of one 0/1 byte per cell with a border of fill around it, and one
+# spare byte at both ends so the slice of every direction fits
+def _pad(values, rows, cols, fill):
+    w = cols + 2
+    ret = bytearray([fill]) * (w * (rows + 2) + 2)
+
+    for y in range(rows):
+        p = (y + 1) * w + 2
+        ret[p:p + cols] = values[y * cols:(y + 1) * cols]
+
+    return ret
+
+# The neighbours (dx, dy) of every cell in a _pad copy as one big integer,
+# a byte per cell and border column. Bytes only hold 0 or 1, so integers
+# of several directions can be ORed, or shifted by up to 7 bits first,
+# without carrying into each other.
+def _around(padded, rows, cols, dx, dy):
+    w = cols + 2
+    p = w + 1 + dy * w + dx
+    return int.from_bytes(padded[p:p + rows * w], 'little')
+
+# Bytes of each cell from a value built by _around
+def _unpad(value, rows, cols):
+    w = cols + 2
+    b = value.to_bytes(rows * w, 'little')
+    return b''.join(b[y * w + 1:y * w + 1 + cols] for y in range(rows))
+
+# JumpTable holds, for each cell of a terrain, the mask of its blocked
+# neighbours and whether its neighbourhood is uniform (plain or blocked),
+# and the runs from each cell in each direction to the next jump point.
+# - near[n]: Whether a cell of the 3x3 neighbourhood of n is uniform; from
+#   any other cell, every run stops after one step, so the search can
+#   relax its edges directly
+# Runs are found on first use, so a jump is walked once rather than once
+# per query; they are dropped when the terrain changes.
+# - runs[e][n]: k > 0 if the run from cell n in direction e ends at a jump
+#   point k steps away, -k - 1 if it ends after k steps without one, 0 if
+#   it was not walked yet. The goal is not taken into account.
+class JumpTable:
+    def __init__(self, terrain, profile = None):
+        profile = profile or costmodel.STANDARD
+
+        if profile.cost(0, 0, True) == inf:
+            raise ValueError("Jump expansion needs a profile with diagonal moves")
+
+        self.terrain = terrain
+        self.profile = profile
+        self.edges = costmodel.edgeCosts(terrain, profile)
+        self.prune = pruningTable(profile)
+
+        # Successors of a cell without blocked neighbours
+        self.natural = [row[0] for row in self.prune]
+
+        # Cost of a step from a uniform cell, and the straight directions a
+        # diagonal run looks down from each of its cells
+        self.step = [profile.cost(0, 0, bool(dx and dy)) for dx, dy in DIRECTIONS]
+        self.sides = [
+            (DIRECTION_INDEX[(dx, 0)], DIRECTION_INDEX[(0, dy)]) if dx and dy else ()
+            for dx, dy in DIRECTIONS
+        ]
+
+        size = terrain.rows * terrain.cols
+        self.mask = bytearray(size)
+        self.uniform = bytearray(size)
+        self.near = bytearray(size)
+        self.runs = None
+        self.build()
+
+        terrain.watch(self.update)
+
+    # Fill mask, uniform and near for the whole terrain. Each is an OR over
+    # a 3x3 neighbourhood, done as one big integer OR per direction (see
+    # _around)
+    def build(self):
+        terrain = self.terrain
+        rows = terrain.rows
+        cols = terrain.cols
+        blocked = _pad(terrain.flags.translate(_BLOCKED), rows, cols, 1)
+        special = _pad(terrain.flags.translate(_SPECIAL), rows, cols, 0)
+
+        # A cell is only uniform if it is plain itself
+        mask = 0
+        near = _around(blocked, rows, cols, 0, 0) | _around(special, rows, cols, 0, 0)
+
+        for e, (dx, dy) in enumerate(DIRECTIONS):
+            mask |= _around(blocked, rows, cols, dx, dy) << e
+            near |= _around(special, rows, cols, dx, dy)
+
+        self.mask[:] = _unpad(mask, rows, cols)
+        self.uniform[:] = _unpad(near, rows, cols).translate(_NOT)
+
+        uniform = _pad(self.uniform, rows, cols, 0)
+        near = _around(uniform, rows, cols, 0, 0)
+        for dx, dy in DIRECTIONS:
+            near |= _around(uniform, rows, cols, dx, dy)
+
+        self.near[:] = _unpad(near, rows, cols)
+        self.runs = None
+
+    def __update(self, i):
+        terrain = self.terrain
+        cols = terrain.cols
+        flags = terrain.flags
+        x = i % cols
+        y = i // cols
+        mask = 0
+        uniform = flags[i] == 0
+
+        for e, (dx, dy) in enumerate(DIRECTIONS):
+            x_p = x + dx
+            y_p = y + dy
+
+            if not (0 <= x_p < cols and 0 <= y_p < terrain.rows):
+                mask |= 1 << e
+                continue
+
+            f = flags[y_p * cols + x_p]
+            if f & gridworld.BLOCKED:
+                mask |= 1 << e
+            elif f:
+                uniform = False
+
+        self.mask[i] = mask
+        self.uniform[i] = uniform
+
+    # Recompute every cell whose neighbourhood contains cell i, and near for
+    # the cells around those
+    def update(self, i):
+        rows = self.terrain.rows
+        cols = self.terrain.cols
+        x = i % cols
+        y = i // cols
+
+        for y_p in range(max(0, y - 1), min(rows, y + 2)):
+            for x_p in range(max(0, x - 1), min(cols, x + 2)):
+                self.__update(y_p * cols + x_p)
+
+        for y_p in range(max(0, y - 2), min(rows, y + 3)):
+            for x_p in range(max(0, x - 2), min(cols, x + 3)):
+                self.near[y_p * cols + x_p] = any(
+                    self.uniform[y_q * cols + x_q]
+                    for y_q in range(max(0, y_p - 1), min(rows, y_p + 2))
+                    for x_q in range(max(0, x_p - 1), min(cols, x_p + 2))
+                )
+
+        # Any run may cross the cell
+        self.runs = None
+
+    def close(self):
+        self.terrain.unwatch(self.update)
+
+    # Run tables, emptied by every change of the terrain
+    def __runs(self):
+        if self.runs is None:
+            self.runs = [array('i', [0]) * len(self.mask) for _ in DIRECTIONS]
+
+        return self.runs
+
+    # Run from cell n in direction e, see runs
+    def run(self, n, e):
+        runs = self.__runs()[e]
+        if runs[n]:
+            return runs[n]
+
+        o = self.edges.offsets[e]
+        c = self.edges.costs[e]
+        prune = self.prune[e]
+        forced = ~self.natural[e]
+        mask = self.mask
+        uniform = self.uniform
+        sides = self.sides[e]
+        walked = []
+        m = n
+
+        while not runs[m]:
+            if c[m] == inf:
+                runs[m] = -1
+                break
+
+            j = m + o
+            if not uniform[j] or prune[mask[j]] & forced or any(self.run(j, s) > 0 for s in sides):
+                runs[m] = 1
+                break
+
+            walked.append(m)
+            m = j
+
+        # Every cell walked over is one step further from the end
+        k = runs[m]
+        for m in reversed(walked):
+            k = k + 1 if k > 0 else k - 1
+            runs[m] = k
+
+        return runs[n]
+
+    # Follow direction e from cell n until a jump point or the goal
+    # Returns (jump point, cost) or None if the run ends without one
+    def jump(self, n, e, goal):
+        k = self.run(n, e)
+        reach = k if k > 0 else -k - 1
+
+        # Steps to where the goal stops the run: on the goal itself, or for
+        # a diagonal run, in the goal's row or column if the straight run
+        # from there reaches it
+        cols = self.terrain.cols
+        dx, dy = DIRECTIONS[e]
+        k_x = (goal % cols - n % cols) * dx
+        k_y = (goal // cols - n // cols) * dy
+        at = None
+
+        if not dy:
+            at = k_x if k_y == 0 and k_x > 0 else None
+        elif not dx:
+            at = k_y if k_x == 0 and k_y > 0 else None
+        elif k_x == k_y:
+            at = k_x if k_x > 0 else None
+        else:
+            a, b = min(k_x, k_y), max(k_x, k_y)
+            if 0 < a <= reach:
+                side = self.sides[e][k_x < k_y]
+                r = self.run(n + a * self.edges.offsets[e], side)
+                if b - a <= (r if r > 0 else -r - 1):
+                    at = a
+
+        if at is not None and at <= reach and (k < 0 or at < k):
+            k = at
+        elif k < 0:
+            return None
+
+        return n + k * self.edges.offsets[e], self.edges.costs[e][n] + (k - 1) * self.step[e]
+
+    # Jump points reachable from cell n, entered from cell p (-1 for none)
+    # Returns a list of (offset of the jump point from n, cost)
+    def successors(self, n, p, goal):
+        if p == -1 or not self.uniform[n]:
+            succ = 0xff
+        else:
+            cols = self.terrain.cols
+            dx = n % cols - p % cols
+            dy = n // cols - p // cols
+            e = DIRECTION_INDEX[((dx > 0) - (dx < 0), (dy > 0) - (dy < 0))]
+            succ = self.prune[e][self.mask[n]]
+
+        runs = self.__runs()
+        cols = self.terrain.cols
+        g_x = goal % cols - n % cols
+        g_y = goal // cols - n // cols
+        offsets = self.edges.offsets
+        costs = self.edges.costs
+        step = self.step
+        ret = []
+
+        for e, (dx, dy) in enumerate(DIRECTIONS):
+            if not succ >> e & 1:
+                continue
+
+            # Only a goal ahead of n can stop the run early
+            if (g_x * dx > 0 if dx else g_x == 0) and (g_y * dy > 0 if dy else g_y == 0):
+                j = self.jump(n, e, goal)
+                if j is not None:
+                    ret.append((j[0] - n, j[1]))
+                continue
+
+            k = runs[e][n] or self.run(n, e)
+            if k > 0:
+                ret.append((k * offsets[e], costs[e][n] + (k - 1) * step[e]))
+
+        return ret
+
+# Jump table of a terrain, built on first use and kept on the terrain for
+# each profile
+def jumpTable(terrain, profile = None):
+    profile = profile or costmodel.STANDARD
+    tables = terrain.jumpTables
+
+    if profile not in tables:
+        tables[profile] = JumpTable(terrain, profile)
+
+    return tables[profile]
+
+# Fill in the cells between consecutive jump points of a path
+# path: List of (x, y), each a straight or diagonal run from the last
+def fillPath(path):
+    if not path:
+        return path
+
+    ret = [path[0]]
+    for x, y in path[1:]:
+        x_p, y_p = ret[-1]
+        dx = (x > x_p) - (x < x_p)
+        dy = (y > y_p) - (y < y_p)
+
+        while (x_p, y_p) != (x, y):
+            x_p += dx
+            y_p += dy
+            ret.append((x_p, y_p))
+
+    return ret
@@ -0,0 +1,291 @@
+import os
+import struct
+import sys
+import zlib
+from array import array
+from math import inf
+import ai
+import gridworld
+import costmodel
+import wavefront
+
+#-------------Landmark (ALT) heuristic--------------
+# NOTE: For any landmark L, the triangle inequality gives
+#       |d(L, v) - d(L, goal)| <= d(v, goal), so the largest such gap over
+#       a few landmarks is an admissible heuristic that, unlike the
+#       geometric ones, knows about walls and highways. Edge costs are
+#       symmetric (EdgeCosts stores each edge for both directions), so one
+#       table per landmark serves as both its forward and backward table.
+#       Tables are float32 to halve their size; values are shrunk by their
+#       rounding error so the heuristic stays a lower bound.
+
+METHODS = ('farthest', 'corners')
+DEFAULT_K = 8
+
+# Relative rounding error of a float32, doubled for safety
+EPS = 2.0 ** -23
+
+# Landmarks holds the distance tables of k landmarks of one terrain and
+# is itself a heuristic (kwargs form) for that terrain
+# - cells: Flat index of each landmark
+# - tables[j][i]: Cost between landmark j and cell i, inf if unreachable
+class Landmarks:
+    def __init__(self, terrain, cells, tables, method = 'farthest', profile = None):
+        self.terrain = terrain
+        self.cells = cells
+        self.tables = tables
+        self.method = method
+        self.profile = profile or costmodel.STANDARD
+        self.version = terrain.version
+
+    def __call__(self, **kwargs):
+        goal = kwargs['goal']
+        v = kwargs['v']
+        cols = self.terrain.cols
+        g = goal[1] * cols + goal[0]
+        i = v[1] * cols + v[0]
+        ret = 0
+
+        for t in self.tables:
+            a = t[i]
+            b = t[g]
+
+            if a == inf or b == inf:
+                if a != b:  # v and goal are not connected
+                    return inf
+                continue
+
+            d = abs(a - b) - (a + b) * EPS
+            if d > ret:
+                ret = d
+
+        return ret
+
+    def field(self, map, start, goal):
+        return ai.HeuristicField(self, map.rows, map.cols, start, goal)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __repr__(self):
+        cols = self.terrain.cols
+        return f"Landmarks({self.method}, {[(i % cols, i // cols) for i in self.cells]})"
+
+# Unblocked cell closest to (x, y) that is not in taken, or None
+def _closestCell(terrain, x, y, taken):
+    flags = terrain.flags
+    cols = terrain.cols
+    ret = None
+    best = inf
+
+    for i in range(len(flags)):
+        if flags[i] & gridworld.BLOCKED or i in taken:
+            continue
+
+        d = (i % cols - x) ** 2 + (i // cols - y) ** 2
+        if d < best:
+            best = d
+            ret = i
+
+    return ret
+
+# Cell with the largest finite value of table, or None
+def _farthestCell(table):
+    ret = None
+    best = -1
+
+    for i, d in enumerate(table):
+        if best < d < inf:
+            best = d
+            ret = i
+
+    return ret
+
+# Choose k landmarks and compute their tables
+# method: 'farthest' picks each landmark as far as possible from the
+#         previous ones, 'corners' picks the cells closest to the corners
+#         and edge midpoints of the map (then continues as 'farthest')
+def selectLandmarks(terrain, k = DEFAULT_K, method = 'farthest', profile = None):
+    if method not in METHODS:
+        raise ValueError(f"Unknown landmark method '{method}', expected one of {', '.join(METHODS)}")
+
+    rows = terrain.rows
+    cols = terrain.cols
+    cells = []
+    tables = []
+
+    def add(i):
+        cells.append(i)
+        tables.append(wavefront.distanceField(terrain, (i % cols, i // cols), profile))
+
+    if method == 'corners':
+        targets = [
+            (0, 0), (cols - 1, rows - 1), (cols - 1, 0), (0, rows - 1),
+            (cols // 2, 0), (cols // 2, rows - 1), (0, rows // 2), (cols - 1, rows // 2)
+        ]
+
+        for x, y in targets[:k]:
+            i = _closestCell(terrain, x, y, cells)
+            if i is not None:
+                add(i)
+
+    if not cells and k > 0:
+        # Start from the cell farthest from the centre, and forget the centre
+        i = _closestCell(terrain, cols // 2, rows // 2, ())
+        if i is None:
+            return Landmarks(terrain, [], [], method, profile)
+
+        i = _farthestCell(wavefront.distanceField(terrain, (i % cols, i // cols), profile))
+        if i is not None:
+            add(i)
+
+    # Each next landmark maximizes its distance to the closest landmark
+    nearest = array('d', tables[0]) if tables else None
+    for t in tables[1:]:
+        for i, d in enumerate(t):
+            if d < nearest[i]:
+                nearest[i] = d
+
+    while nearest is not None and len(cells) < k:
+        i = _farthestCell(nearest)
+        if i is None or nearest[i] == 0:
+            break
+
+        add(i)
+        for j, d in enumerate(tables[-1]):
+            if d < nearest[j]:
+                nearest[j] = d
+
+    return Landmarks(terrain, cells, [array('f', t) for t in tables], method, profile)
+
+#-------------Landmark files--------------
+# NOTE: Tables can be saved next to a map (test1.gw -> test1.alt) and are
+#       only loaded back for the same terrain and profile:
+#       An ALT_HEADER, the landmark cells as int32, then k tables of
+#       rows * cols float32, all little-endian.
+
+ALT_MAGIC = b'ALT1'
+ALT_HEADER = struct.Struct('<4sIIIIII')  # magic, rows, cols, k, method, crc32 of the codes, crc32 of the profile
+
+def landmarkPath(path):
+    return os.path.splitext(path)[0] + '.alt'
+
+def _checksums(terrain, profile):
+    return zlib.crc32(terrain.codes), zlib.crc32(repr(profile or costmodel.STANDARD).encode())
+
+def saveLandmarks(path, landmarks):
+    terrain = landmarks.terrain
+    cells = array('i', landmarks.cells)
+    tables = [array('f', t) for t in landmarks.tables]
+
+    if sys.byteorder == 'big':
+        for a in [cells] + tables:
+            a.byteswap()
+
+    with open(path, 'wb') as f:
+        f.write(ALT_HEADER.pack(ALT_MAGIC, terrain.rows, terrain.cols, len(cells),
+                                METHODS.index(landmarks.method), *_checksums(terrain, landmarks.profile)))
+        f.write(cells.tobytes())
+        for t in tables:
+            f.write(t.tobytes())
+
+# Landmarks of terrain stored at path, or None if there are none for it
+def loadLandmarks(path, terrain, profile = None):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+
+    if len(data) < ALT_HEADER.size:
+        return None
+
+    magic, rows, cols, k, method, codes_crc, profile_crc = ALT_HEADER.unpack_from(data)
+    size = rows * cols
+
+    if (magic != ALT_MAGIC or (rows, cols) != (terrain.rows, terrain.cols)
+            or (codes_crc, profile_crc) != _checksums(terrain, profile)
+            or len(data) != ALT_HEADER.size + 4 * k + 4 * k * size):
+        return None
+
+    offset = ALT_HEADER.size
+    cells = array('i', data[offset:offset + 4 * k])
+    offset += 4 * k
+
+    tables = []
+    for _ in range(k):
+        tables.append(array('f', data[offset:offset + 4 * size]))
+        offset += 4 * size
+
+    if sys.byteorder == 'big':
+        for a in [cells] + tables:
+            a.byteswap()
+
+    return Landmarks(terrain, list(cells), tables, METHODS[method], profile)
+
+#-------------Shared landmarks--------------
+# NOTE: Selecting landmarks costs k + 1 Dijkstra searches, so they are
+#       kept on the terrain and shared by every query on it.
+
+# Landmarks of a terrain, selected on first use and reselected after the
+# terrain is edited; they are kept in terrain.landmarkTables
+# k, method: Number of landmarks and how they are selected; None for the
+#            landmarks attached to the terrain (see attachLandmarks), or
+#            DEFAULT_K 'farthest' ones if none are
+# path: Map file; if given, the tables are loaded from (or saved to) the
+#       landmark file next to it
+def landmarksFor(terrain, k = None, method = None, profile = None, path = None):
+    profile = profile or costmodel.STANDARD
+    cache = terrain.landmarkTables
+    key = (k, method, profile)
+    ret = cache.get(key)
+
+    if ret is None or ret.version != terrain.version:
+        ret = None
+
+        if path is not None:
+            ret = loadLandmarks(landmarkPath(path), terrain, profile)
+            if ret is not None and (k not in (None, len(ret)) or method not in (None, ret.method)):
+                ret = None
+
+        if ret is None:
+            ret = selectLandmarks(terrain, k or DEFAULT_K, method or 'farthest', profile)
+
+            if path is not None:
+                saveLandmarks(landmarkPath(path), ret)
+
+        cache[key] = ret
+
+    return ret
+
+# Make the landmarks saved next to a map file available to h_landmarks,
+# if there are any for terrain. They serve lookups for their own k and
+# method, and lookups that name neither.
+# Returns the Landmarks, or None
+def attachLandmarks(terrain, path, profile = None):
+    ret = loadLandmarks(landmarkPath(path), terrain, profile)
+
+    if ret is not None:
+        terrain.landmarkTables[(len(ret), ret.method, ret.profile)] = ret
+        terrain.landmarkTables[(None, None, ret.profile)] = ret
+
+    return ret
+
+# LandmarkHeuristic is the ALT heuristic of whatever map it is used on,
+# through the shared landmarks of that map
+# k, method: As for landmarksFor
+class LandmarkHeuristic:
+    admissible = True
+
+    def __init__(self, k = None, method = None, profile = None):
+        self.k = k
+        self.method = method
+        self.profile = profile
+
+    def field(self, map, start, goal):
+        return landmarksFor(map, self.k, self.method, self.profile).field(map, start, goal)
+
+    def __repr__(self):
+        return f"LandmarkHeuristic({self.k}, {self.method})"
+
+h_landmarks = LandmarkHeuristic()
@@ -0,0 +1,258 @@
+import multiprocessing
+import queue
+import time
+from math import inf
+from multiprocessing import shared_memory, util
+from time import perf_counter
+import a_star
+import ai
+import costmodel
+import gridworld
+from costmodel import DIRECTION_INDEX
+
+#-------------Parallel multi-heuristic search--------------
+# NOTE: Runs the queues of a_star.sequential at the same time instead of
+#       round-robin: the anchor search runs in the calling process and
+#       each inadmissible heuristic gets a worker process. Workers attach
+#       to the terrain in shared memory and are reused for every query.
+#       The only state shared while searching is a small control block:
+#       - the largest key the anchor has had at the top of its queue
+#       - the id of the last query that was stopped, so workers drop
+#         the rest of it
+#       - the expansions of each queue so far
+#       As in the sequential version, each queue keeps its own g-values,
+#       so every array has a single writer and needs no locking. A worker
+#       path is only accepted once its cost is at most w2 times an anchor
+#       key. Every anchor key is at most w1 times the optimal cost, even a
+#       stale one, so the w1 * w2 bound holds however the processes
+#       interleave.
+
+# Expansions between two looks at the control block
+BATCH = 64
+
+# Control block slots
+ANCHOR_KEY = 0
+STOPPED = 1
+EXPANSIONS = 2
+
+def _worker(shm_name, rows, cols, k, h, profile, control, conn, results):
+    shm = shared_memory.SharedMemory(shm_name)
+    terrain = gridworld.Terrain(rows, cols, shm.buf[:rows * cols])
+    edges = costmodel.edgeCosts(terrain, profile)
+    buffers = [a_star.SearchBuffers(rows * cols)]
+
+    try:
+        while True:
+            task = conn.recv()
+            if task is None:
+                break
+
+            qid, start, goal, w1, w2 = task
+            goal_i = goal[1] * cols + goal[0]
+            b = buffers[0]
+            search = a_star.iterSequential(terrain, start, goal, w1, 1, [h], profile = profile, buffers = buffers, batch = BATCH)
+            expansions = 0
+            exhausted = False
+            found = None
+
+            try:
+                while control[STOPPED] < qid:
+                    if not exhausted:
+                        try:
+                            done, _ = next(search)
+                            expansions += len(done)
+                            control[EXPANSIONS + k] = expansions
+                        except StopIteration:
+                            exhausted = True
+
+                    g_goal = b.gAt(goal_i)
+                    if g_goal <= w2 * control[ANCHOR_KEY]:
+                        found = b.path(goal_i, cols)
+                        break
+
+                    if exhausted:
+                        if g_goal == inf:
+                            break
+
+                        # Wait for the anchor to prove the path good enough
+                        time.sleep(0.0005)
+            finally:
+                search.close()
+
+            if found:
+                # The parent chain can be cheaper than g(goal) after a
+                # cell on it was improved, so report what it really costs
+                cost = 0
+                for (x, y), (x_p, y_p) in zip(found, found[1:]):
+                    cost += edges.cost(y * cols + x, DIRECTION_INDEX[(x_p - x, y_p - y)])
+
+                results.put((qid, k, cost, found, expansions))
+    finally:
+        terrain.codes.release()
+        shm.close()
+
+# Stop the workers of a ParallelSearcher and free its shared memory
+def _shutdown(workers, results, shm):
+    for p, conn in workers:
+        conn.send(None)
+
+    for p, conn in workers:
+        p.join()
+        conn.close()
+
+    workers.clear()
+    results.close()
+    shm.close()
+    shm.unlink()
+
+class ParallelSearcher:
+    # terrain: Gridworld terrain map; it is copied to shared memory, so
+    #          later edits are not seen by the workers
+    # list_h: Heuristic functions, list_h[0] is the anchor heuristic;
+    #         they must be picklable (e.g. module level functions)
+    # profile: Edge cost profile, default costmodel.STANDARD
+    def __init__(self, terrain, list_h = ai.all_heuristics, profile = None):
+        rows = terrain.rows
+        cols = terrain.cols
+
+        self.terrain = terrain
+        self.list_h = list(list_h)
+        self.profile = profile
+        self.version = terrain.version
+        self.buffers = [a_star.SearchBuffers(rows * cols)]
+        self.qid = 0
+
+        self.shm = shared_memory.SharedMemory(create = True, size = max(rows * cols, 1))
+        self.shm.buf[:rows * cols] = terrain.codes
+
+        self.control = multiprocessing.RawArray('d', EXPANSIONS + len(self.list_h))
+        self.results = multiprocessing.Queue()
+        self.workers = []
+
+        for k, h in enumerate(self.list_h[1:], 1):
+            conn, child = multiprocessing.Pipe()
+            p = multiprocessing.Process(
+                target = _worker,
+                args = (self.shm.name, rows, cols, k, h, profile, self.control, child, self.results),
+                daemon = True
+            )
+            p.start()
+            child.close()
+            self.workers.append((p, conn))
+
+        # Pool workers exit without running atexit, but with the
+        # finalizers of multiprocessing. The finalizer does not hold the
+        # searcher, so it also runs once the searcher is collected.
+        self.__shutdown = util.Finalize(self, _shutdown, (self.workers, self.results, self.shm), exitpriority = 0)
+
+    def close(self):
+        self.__shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Search from start to goal
+    # w1: Overall weight, default 1.25
+    # w2: Inadmissable-favored weight, default 2
+    # field: HeuristicField of the anchor heuristic for this query, if the
+    #        caller keeps one
+    # Returns a dict with the path ('map'), its 'cost', the 'queue' that
+    # found it, the number of 'expansions' and the SearchStats ('stats'),
+    # or None if there is no path
+    def query(self, start, goal, w1 = 1.25, w2 = 2, field = None):
+        t = perf_counter()
+        control = self.control
+
+        self.qid += 1
+        qid = self.qid
+        control[ANCHOR_KEY] = 0
+        for k in range(len(self.list_h)):
+            control[EXPANSIONS + k] = 0
+
+        for p, conn in self.workers:
+            conn.send((qid, start, goal, w1, w2))
+
+        stats = a_star.SearchStats(len(self.list_h))
+        fringe = self.buffers[0].fringe
+        search = a_star.iterSequential(self.terrain, start, goal, w1, 1, self.list_h[:1], profile = self.profile,
+                                       buffers = self.buffers, fields = None if field is None else [field], batch = BATCH)
+        anchor_key = 0
+        ret = None
+
+        try:
+            while True:
+                try:
+                    done, _ = next(search)
+                    stats.expansions[0] += len(done)
+                except StopIteration as e:
+                    if e.value:
+                        ret = {'map': e.value['map'], 'cost': e.value['cost'], 'queue': 0}
+                    break
+
+                # Any key the anchor had at the top of its queue bounds the
+                # optimal cost from below (times w1), so keep the largest
+                key = fringe.minKey()
+                if anchor_key < key < inf:
+                    anchor_key = key
+                    control[ANCHOR_KEY] = key
+
+                ret = self.__poll(qid, w2 * anchor_key)
+                if ret:
+                    break
+        finally:
+            search.close()
+            control[STOPPED] = qid
+
+        for k in range(1, len(self.list_h)):
+            stats.expansions[k] = int(control[EXPANSIONS + k])
+
+        stats.search_time = perf_counter() - t
+
+        if ret is None:
+            return None
+
+        ret['stats'] = stats
+        ret['expansions'] = stats.totalExpansions()
+        return ret
+
+    # First worker path of query qid costing at most limit, or None
+    def __poll(self, qid, limit):
+        while True:
+            try:
+                r_qid, k, cost, path, expansions = self.results.get_nowait()
+            except queue.Empty:
+                return None
+
+            if r_qid == qid and cost <= limit:
+                return {'map': path, 'cost': cost, 'queue': k}
+
+#-------------Shared workers--------------
+# NOTE: Starting the workers and copying the terrain takes far longer
+#       than a query, so they are kept on the terrain and shared by every
+#       query on it. They are restarted once the terrain is edited, and
+#       shut down by closeSearchers, once the terrain is collected, or at
+#       exit.
+
+# ParallelSearcher of a terrain for list_h and profile, started on first use
+def parallelSearcher(terrain, list_h = ai.all_heuristics, profile = None):
+    searchers = terrain.parallelSearchers
+    key = (tuple(list_h), profile)
+    ret = searchers.get(key)
+
+    if ret is None or ret.version != terrain.version:
+        if ret is not None:
+            ret.close()
+
+        ret = searchers[key] = ParallelSearcher(terrain, list_h, profile)
+
+    return ret
+
+# Shut down the workers of every ParallelSearcher of a terrain
+def closeSearchers(terrain):
+    for searcher in terrain.parallelSearchers.values():
+        searcher.close()
+
+    terrain.parallelSearchers.clear()
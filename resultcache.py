@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from array import array
+import a_star
+
+#-------------Persistent result cache--------------
+# NOTE: Search results are kept in a SQLite file, keyed by a hash of the
+#       terrain codes and the search configuration, so repeating a query
+#       in a later run or GUI session reads it back instead of searching.
+#       Paths (and, if asked for, the f, g and h grids) are stored as
+#       zlib-compressed arrays. Once the stored results grow past
+#       max_bytes, the least recently used ones are dropped.
+#       Only deterministic searches are cached: not 'parallel', whose
+#       result depends on which process finishes first, nor an anytime
+#       search with a deadline. Queries without a path are not cached.
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Part of every key; bumped when the searches change what they return, so
+# results stored by older code are no longer found (2: anytime only gives
+# a bound for admissible heuristics, 3: contracted highway overlay)
+FORMAT = 3
+
+# Result keys stored along with the path, if a result has them
+EXTRA_KEYS = ('bound', 'w', 'solutions')
+
+def defaultPath():
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'informed_search', 'results.sqlite')
+
+# Hash of the size and codes of a terrain
+def terrainHash(terrain):
+    ret = hashlib.sha256(f"{terrain.rows}x{terrain.cols}:".encode())
+    ret.update(terrain.codes)
+    return ret.hexdigest()
+
+# Whether the result of a configuration (see searcher.parseConfig) can be
+# cached
+def cacheable(config):
+    if config['algorithm'] == 'parallel':
+        return False
+
+    return not (config['algorithm'] == 'anytime' and config.get('deadline') is not None)
+
+def _pack(values, typecode):
+    a = array(typecode, values)
+    if sys.byteorder == 'big':
+        a.byteswap()
+
+    return zlib.compress(a.tobytes())
+
+def _unpack(data, typecode):
+    ret = array(typecode)
+    ret.frombytes(zlib.decompress(data))
+    if sys.byteorder == 'big':
+        ret.byteswap()
+
+    return ret
+
+class ResultCache:
+    # path: SQLite file, default defaultPath(); its directory is created
+    # max_bytes: Size of the stored results to keep at most
+    def __init__(self, path = None, max_bytes = DEFAULT_MAX_BYTES):
+        path = path or defaultPath()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        # Worker processes may share the file, so wait for their writes
+        self.db = sqlite3.connect(path, timeout = 30)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                cost REAL NOT NULL,
+                expansions INTEGER NOT NULL,
+                stats TEXT NOT NULL,
+                extra TEXT NOT NULL,
+                path BLOB NOT NULL,
+                f BLOB,
+                g BLOB,
+                h BLOB,
+                size INTEGER NOT NULL,
+                used REAL NOT NULL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def key(self, terrain, start, goal, config):
+        params = dict(config)
+        params['start'] = list(start)
+        params['goal'] = list(goal)
+        params['format'] = FORMAT
+
+        return terrainHash(terrain) + ':' + json.dumps(params, sort_keys = True)
+
+    # Cached result of a query, or None
+    # config: Configuration dict, see searcher.parseConfig
+    # fields: Only return results stored with their f, g and h grids
+    # Returns a dict as for a_star.sequential, without f, g and h unless
+    # they were stored
+    def get(self, terrain, start, goal, config, fields = False):
+        key = self.key(terrain, start, goal, config)
+        row = self.db.execute(
+            "SELECT cost, expansions, stats, extra, path, f, g, h FROM results WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None or (fields and row[5] is None):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        cost, expansions, stats, extra, path, f, g, h = row
+        cols = terrain.cols
+
+        with self.db:
+            self.db.execute("UPDATE results SET used = ? WHERE key = ?", (time.time(), key))
+
+        ret = {
+            'map': [(i % cols, i // cols) for i in _unpack(path, 'i')],
+            'cost': cost,
+            'expansions': expansions,
+            'stats': a_star.SearchStats.fromDict(json.loads(stats)),
+            **json.loads(extra)
+        }
+
+        if f is not None:
+            for name, data in (('f', f), ('g', g), ('h', h)):
+                ret[name] = a_star.GridView(_unpack(data, 'd'), terrain.rows, cols)
+
+        return ret
+
+    # Store the result of a query
+    # info: Search result; not stored if None
+    # fields: Also store its f, g and h grids (if it has them)
+    def put(self, terrain, start, goal, config, info, fields = False):
+        if info is None or not cacheable(config):
+            return
+
+        cols = terrain.cols
+        size = terrain.rows * cols
+        path = _pack((y * cols + x for x, y in info['map']), 'i')
+        grids = [None, None, None]
+
+        if fields and all(name in info for name in ('f', 'g', 'h')):
+            grids = [_pack((info[name].values[i] for i in range(size)), 'd') for name in ('f', 'g', 'h')]
+
+        extra = json.dumps({k: info[k] for k in EXTRA_KEYS if k in info})
+        nbytes = len(path) + len(extra) + sum(len(b) for b in grids if b is not None)
+
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.key(terrain, start, goal, config), info['cost'], info['expansions'],
+                 json.dumps(info['stats'].asDict()), extra, path, *grids, nbytes, time.time())
+            )
+            self.evict()
+
+    # Drop the least recently used results until the rest fit in max_bytes
+    def evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        drop = []
+        for key, size in self.db.execute("SELECT key, size FROM results ORDER BY used"):
+            if total <= self.max_bytes:
+                break
+
+            drop.append((key,))
+            total -= size
+
+        self.db.executemany("DELETE FROM results WHERE key = ?", drop)
+
+    def clear(self):
+        with self.db:
+            self.db.execute("DELETE FROM results")
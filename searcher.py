@@ -0,0 +1,223 @@
+from collections import OrderedDict
+import a_star
+import ai
+import costmodel
+import fringe
+import distances
+import hpa
+import landmarks
+import parallel
+
+#-------------Multi-query search--------------
+# NOTE: GridSearcher binds the search to one terrain so that many
+#       start/goal queries share everything that does not depend on
+#       the query: the edge cost table, the search buffers and the
+#       heuristic fields of each goal.
+#       The 'exact' algorithm answers a query from the cached cost-to-goal
+#       field of its goal (see distances.py) without searching, and
+#       'hierarchical' searches the cluster graph of hpa.py.
+#       'parallel' runs the queues of 'sequential' in worker processes
+#       (see parallel.py) and takes the same w, w2 and anchor.
+
+ALGORITHMS = ('default', 'uniform', 'weighted', 'sequential', 'exact', 'hierarchical', 'anytime', 'parallel')
+EXPANSIONS = ('full', 'jump', 'highway')
+
+# Parse a configuration of the form algorithm[,key=value...]
+# Keys: h (heuristic name without the h_ prefix), w, w2, anchor (a
+# heuristic put in front of the sequential heuristics as its anchor),
+# expand ('full', 'jump' or 'highway', see a_star.iterSequential), the flag
+# bidirectional (see a_star.iterBidirectional), deadline (seconds an
+# anytime search may run for, see a_star.iterAnytime) and open ('heap' or
+# 'bucket', see fringe.py)
+# Returns a dict with 'algorithm', 'h', 'w', 'w2', 'anchor', 'expand',
+# 'bidirectional', 'deadline' and 'open'
+def parseConfig(text):
+    algorithm, *params = text.split(',')
+    ret = {
+        'algorithm': algorithm, 'h': 'pythagorean', 'w': None, 'w2': None, 'anchor': None,
+        'expand': 'full', 'bidirectional': False, 'deadline': None, 'open': 'heap'
+    }
+
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown algorithm '{algorithm}', expected one of {', '.join(ALGORITHMS)}")
+
+    for p in params:
+        key, _, value = p.partition('=')
+
+        if key in ('h', 'anchor'):
+            heuristic(value)
+            ret[key] = value
+        elif key in ('w', 'w2', 'deadline'):
+            ret[key] = float(value)
+        elif key == 'bidirectional' and not value:
+            if algorithm not in ('default', 'uniform', 'weighted'):
+                raise ValueError(f"Bidirectional search needs a single heuristic, not '{algorithm}'")
+            ret[key] = True
+        elif key == 'expand':
+            if value not in EXPANSIONS:
+                raise ValueError(f"Unknown expansion '{value}', expected one of {', '.join(EXPANSIONS)}")
+            ret[key] = value
+        elif key == 'open':
+            if value not in fringe.OPEN_LISTS:
+                raise ValueError(f"Unknown open list '{value}', expected one of {', '.join(fringe.OPEN_LISTS)}")
+            ret[key] = value
+        else:
+            raise ValueError(f"Unknown parameter '{key}' in '{text}'")
+
+    return ret
+
+# Heuristic function by name, e.g. 'manhattan' for ai.h_manhattan,
+# 'exact' for distances.h_exact or 'landmarks' for landmarks.h_landmarks
+def heuristic(name):
+    h = None
+    for module in (ai, distances, landmarks):
+        h = h or getattr(module, 'h_' + name, None)
+
+    if h is None:
+        raise ValueError(f"Unknown heuristic '{name}'")
+
+    return h
+
+# Arguments (w, w2, list_h) of a_star.iterSequential for a configuration
+def searchArgs(config):
+    algorithm = config['algorithm']
+    w = config['w']
+    w2 = config['w2']
+
+    if algorithm == 'uniform':
+        return 0, 1, [ai.h_uniform_first]
+    elif algorithm == 'default':
+        return 1, 1, [ai.h_pythagorean]
+    elif algorithm == 'weighted':
+        return 1 if w is None else w, 1, [heuristic(config['h'])]
+    else:
+        list_h = ai.all_heuristics
+        if config.get('anchor'):
+            list_h = [heuristic(config['anchor'])] + list_h
+
+        return 1.25 if w is None else w, 2 if w2 is None else w2, list_h
+
+class GridSearcher:
+    # terrain: Gridworld terrain map
+    # profile: Edge cost profile, default costmodel.STANDARD
+    # max_fields: Number of heuristic fields to keep cached
+    def __init__(self, terrain, profile = None, max_fields = 32):
+        self.terrain = terrain
+        self.profile = profile
+        self.edges = costmodel.edgeCosts(terrain, profile)
+        self.buffers = {}
+        self.max_fields = max_fields
+        self.fields = OrderedDict()
+
+    # Heuristic field of h for a query, shared by every query to the same
+    # goal (and start, for heuristics that depend on it)
+    def field(self, h, start, goal):
+        # Fields built from the map are rebuilt once the terrain is edited
+        version = self.terrain.version if hasattr(h, 'field') else None
+        key = (h, tuple(start) if h in ai.start_heuristics else None, tuple(goal), version)
+        fields = self.fields
+
+        if key in fields:
+            fields.move_to_end(key)
+        else:
+            # Fields are filled lazily; a cached field keeps the values of
+            # every query that used it
+            fields[key] = ai.heuristicField(h, self.terrain, start, goal, 'lazy')
+
+            if len(fields) > self.max_fields:
+                fields.popitem(last = False)
+
+        return fields[key]
+
+    # Search buffers for n queues, reused by every query
+    # open_list: Open list of the buffers, see a_star.SearchBuffers
+    def searchBuffers(self, n, open_list = 'heap'):
+        size = self.terrain.rows * self.terrain.cols
+        buffers = self.buffers.setdefault(open_list, [])
+        while len(buffers) < n:
+            buffers.append(a_star.SearchBuffers(size, open_list))
+
+        return buffers[:n]
+
+    # Streaming form of query, see a_star.iterSequential
+    def iterQuery(self, start, goal, config = 'default', **kwargs):
+        if isinstance(config, str):
+            config = parseConfig(config)
+
+        if config['algorithm'] == 'exact':
+            return self.iterExact(start, goal)
+        elif config['algorithm'] == 'hierarchical':
+            return self.iterHierarchical(start, goal)
+        elif config['algorithm'] == 'parallel':
+            return self.iterParallel(start, goal, config)
+        elif config['algorithm'] == 'anytime':
+            h = heuristic(config['h'])
+            kwargs.setdefault('fields', [self.field(h, start, goal)])
+            kwargs.setdefault('buffers', self.searchBuffers(1, config.get('open', 'heap')))
+
+            return a_star.iterAnytime(self.terrain, start, goal, 3 if config['w'] is None else config['w'], h,
+                                      deadline = config.get('deadline'), profile = self.profile, **kwargs)
+
+        w, w2, list_h = searchArgs(config)
+
+        if config.get('bidirectional'):
+            if config.get('expand', 'full') != 'full':
+                raise ValueError("Bidirectional search only supports full expansion")
+
+            kwargs.setdefault('fields', [self.field(list_h[0], start, goal), self.field(list_h[0], goal, start)])
+            kwargs.setdefault('buffers', self.searchBuffers(2, config.get('open', 'heap')))
+            return a_star.iterBidirectional(self.terrain, start, goal, w, list_h[0], profile = self.profile, **kwargs)
+
+        kwargs.setdefault('fields', [self.field(h, start, goal) for h in list_h])
+        kwargs.setdefault('buffers', self.searchBuffers(len(list_h), config.get('open', 'heap')))
+        kwargs.setdefault('expand', config.get('expand', 'full'))
+
+        return a_star.iterSequential(self.terrain, start, goal, w, w2, list_h, profile = self.profile, **kwargs)
+
+    # Exact query from the cost-to-goal field of goal, in O(path length)
+    # once the field is cached. Has the form of a search generator that
+    # never yields, so it can stand in for iterSequential.
+    def iterExact(self, start, goal):
+        d = distances.goalDistances(self.terrain, goal, self.profile)
+        path = d.path(start)
+
+        if path is None:
+            return None
+
+        return {
+            'h': a_star.GridView(d.dist, self.terrain.rows, self.terrain.cols),
+            'map': path,
+            'cost': d.cost(start),
+            'stats': a_star.SearchStats(1),
+            'expansions': 0
+        }
+        yield
+
+    # Hierarchical query over the clusters of the terrain, see hpa.py
+    # Paths are near-optimal rather than optimal
+    def iterHierarchical(self, start, goal):
+        return hpa.hierarchy(self.terrain, profile = self.profile).search(start, goal)
+        yield
+
+    # Multi-heuristic query with one worker process per inadmissible
+    # heuristic, see parallel.py. The workers are shared by every
+    # searcher on the terrain.
+    def iterParallel(self, start, goal, config):
+        w, w2, list_h = searchArgs(config)
+        workers = parallel.parallelSearcher(self.terrain, list_h, self.profile)
+
+        return workers.query(start, goal, w, w2, self.field(list_h[0], start, goal))
+        yield
+
+    # Run one query
+    # config: Configuration dict or string, see parseConfig
+    # Other keyword arguments are passed on to a_star.iterSequential
+    # Returns the search result, see a_star.sequential. Its f and g grids
+    # are only valid until the next query on this searcher.
+    def query(self, start, goal, config = 'default', **kwargs):
+        return a_star.run(self.iterQuery(start, goal, config, batch = None, **kwargs))
+
+    # Run one query per (start, goal) pair
+    # Returns the list of results
+    def query_many(self, pairs, config = 'default', **kwargs):
+        return [self.query(start, goal, config, **kwargs) for start, goal in pairs]
@@ -0,0 +1,140 @@
+from array import array
+from math import inf
+import costmodel
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#-------------Wavefront distance fields--------------
+# NOTE: Costs from every cell to one goal, for whole-map work such as
+#       heatmaps or checking a heuristic against the true costs, where
+#       the path itself is not needed (see distances.py for that).
+#       - 'sweep' needs NumPy. Each round relaxes the edges of all pending
+#         cells within WINDOW cheapest edges of the closest one at once,
+#         as array operations; cells that improve become pending again,
+#         until none does. A narrow window settles cells in order like
+#         Dijkstra, a wide one needs fewer rounds but redoes more cells.
+#       - 'buckets' needs only the standard library. Cells are settled in
+#         buckets as wide as the cheapest edge: a cell can only improve a
+#         neighbour by at least that much, so a bucket never improves
+#         itself and all of its cells are final once it is reached (Dial's
+#         algorithm for non-integer costs).
+#       Both give the same costs as a Dijkstra search.
+
+METHODS = ('auto', 'sweep', 'buckets')
+
+# Width of a 'sweep' round, in cheapest edges
+WINDOW = 4
+
+# Cost from every cell to goal, as an array('d') of rows * cols values
+# indexed by y * cols + x; inf where the goal cannot be reached
+# method: 'sweep' (needs NumPy), 'buckets', or 'auto' to use NumPy if it
+#         is installed
+def distanceField(terrain, goal, profile = None, method = 'auto'):
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}', expected one of {', '.join(METHODS)}")
+
+    if method == 'auto':
+        method = 'buckets' if numpy is None else 'sweep'
+
+    if method == 'sweep' and numpy is None:
+        raise ValueError("The 'sweep' method needs NumPy")
+
+    edges = costmodel.edgeCosts(terrain, profile)
+    g = goal[1] * terrain.cols + goal[0]
+
+    if method == 'sweep':
+        return _sweep(edges, g, terrain.rows * terrain.cols)
+
+    return _buckets(edges, g, terrain.rows * terrain.cols)
+
+# Cheapest finite edge cost of a profile
+def _cheapestEdge(profile):
+    ret = min(
+        c for a in range(8) for b in range(8) for d in (False, True)
+        for c in (profile.cost(a, b, d),) if c < inf
+    )
+
+    if ret <= 0:
+        raise ValueError("Wavefront fields need edges of positive cost")
+
+    return ret
+
+# Edges are followed in reverse: cell m reaches the goal through m + offset
+def _sweep(edges, g, size):
+    window = WINDOW * _cheapestEdge(edges.profile)
+    dist = numpy.full(size, inf)
+    dist[g] = 0
+
+    # Views of the edge tables, so cells patched by EdgeCosts are seen
+    costs = [numpy.frombuffer(c, dtype = numpy.float64) for c in edges.costs]
+    pending = numpy.array([g])
+
+    while pending.size:
+        d_p = dist[pending]
+        near = d_p < d_p.min() + window
+        front = pending[near]
+        improved = [pending[~near]]
+
+        for o, c in zip(edges.offsets, costs):
+            m = front - o
+            inside = (m >= 0) & (m < size)
+            m = m[inside]
+            d = dist[front[inside]] + c[m]
+
+            # Each front cell has one neighbour per direction, so m holds
+            # no duplicates
+            better = d < dist[m]
+            m = m[better]
+            dist[m] = d[better]
+            improved.append(m)
+
+        pending = numpy.unique(numpy.concatenate(improved))
+
+    ret = array('d')
+    ret.frombytes(dist.tobytes())
+    return ret
+
+def _buckets(edges, g, size):
+    scale = 1 / _cheapestEdge(edges.profile)
+    neighbours = tuple(zip(edges.offsets, edges.costs))
+    dist = array('d', [inf]) * size
+
+    # Cost each cell had when it was last expanded; a cell queued again
+    # with the same cost is skipped
+    expanded = array('d', [inf]) * size
+
+    dist[g] = 0
+    buckets = [[g]]
+    k = 0
+
+    while k < len(buckets):
+        # Cells appended to this bucket while it is read are read as well
+        for n in buckets[k]:
+            d = dist[n]
+            if expanded[n] <= d:
+                continue
+
+            expanded[n] = d
+
+            for o, c in neighbours:
+                m = n - o
+
+                if 0 <= m < size:
+                    d_m = d + c[m]
+
+                    if d_m < dist[m]:
+                        dist[m] = d_m
+                        b = int(d_m * scale)
+
+                        while len(buckets) <= b:
+                            buckets.append([])
+
+                        buckets[b].append(m)
+
+        buckets[k] = None
+        k += 1
+
+    return dist